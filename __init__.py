@@ -1,14 +1,10 @@
 import bpy
-import requests
 import asyncio
 import logging
+import time
 import numpy as np
-from transformers import T5ForConditionalGeneration, T5Tokenizer
-from openvino.inference_engine import IECore
-from onnx import load_model
-from openml import datasets
-import oneapi as oa
-from intelPython import ip
+import os
+from . import endpoint_pool, kv_snapshots, lm_client, message_history, model_registry, request_queue, response_cache, scheduler, semantic_cache
 
 bl_info = {
     "name": "SSD Mesh Blender Extension",
@@ -26,41 +22,122 @@ logging.basicConfig(level=logging.ERROR)
 
 # LM Studio API endpoint
 LM_STUDIO_URL = "http://localhost:5000/v1/chat/completions"
+# LM Studio instances sharing the load, as (base URL, weight); requests to LM_STUDIO_URL are balanced over them
+LM_STUDIO_ENDPOINTS = [("http://localhost:5000", 1.0)]
+DEFAULT_MODEL_PARAMS = {
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "max_tokens": 1500,
+    "model": "t5"  # Specify the model name here
+}
+
+# Serve cached responses for similar (not only identical) prompts; off by default because two
+# different mesh prompts above semantic_cache.SIMILARITY_THRESHOLD would share one cached mesh
+ENABLE_SEMANTIC_CACHE = False
+
+# Streaming settings: text block receiving the tokens, how often tokens are flushed into it
+# and the minimum time between redraws of the text editor and status bar (seconds)
+STREAM_TEXT_NAME = "AI Response"
+STREAM_FRAME_BUDGET = 1 / 30
+STREAM_REDRAW_INTERVAL = 1 / 10
+
+# Chat history of streamed exchanges, as {"type": ..., "content": ...} dicts
+chat_history = []
+# Conversation id of chat_history, which keeps its turns on one server
+chat_conversation = message_history.new_conversation_id()
+# Append-only chat session used when "Reuse Prompt Cache" is enabled
+chat_session = None
+
+# Batching queue shared by every get_model_response call
+model_request_queue = request_queue.RequestQueue(LM_STUDIO_URL)
 
 # Adjust this if necessary
 
+# Function to get the prefix-stable chat session for a system prompt, starting a new one when it changes
+def get_chat_session(system_prompt):
+    global chat_session
+    if chat_session is None or chat_session.system_prompt != system_prompt:
+        chat_session = message_history.ChatSession(system_prompt)
+    return chat_session
+
+# Function to build the request payload, from the chat history or from an append-only ChatSession
+def request_payload(prompt, chat_history, system_prompt, model_params, session=None, conversation=None):
+    if session is not None:
+        return session.payload(prompt, model_params)
+    payload = {
+        "messages": generate_message_history(chat_history, system_prompt, prompt, model_params.get("max_tokens", 0)),
+        **model_params
+    }
+    if conversation is not None:
+        payload["user"] = conversation
+    return payload
+
 # Function to get response from the LM Studio model
-async def get_model_response(prompt, chat_history, system_prompt, model_params=None):
+async def get_model_response(prompt, chat_history, system_prompt, model_params=None, session=None, conversation=None):
     try:
-        model_params = model_params or {
-            "temperature": 0.7,
-            "top_p": 0.9,
-            "max_tokens": 1500,
-            "model": "t5"  # Specify the model name here
-        }
-        payload = {
-            "messages": generate_message_history(chat_history, system_prompt, prompt),
-            **model_params
-        }
-        response = await asyncio.to_thread(requests.post, LM_STUDIO_URL, json=payload)
-        response.raise_for_status()
-        return response.json().get("choices", [{}])[0].get("message", {}).get("content", "No response from model")
+        model_params = model_params or DEFAULT_MODEL_PARAMS
+        payload = request_payload(prompt, chat_history, system_prompt, model_params, session, conversation)
+        response = await model_request_queue.submit(payload)
+        text = lm_client.completion_text(response)
+        if text is None:
+            # Nothing to append: the session's prefix stays as it was
+            return "No response from model"
+        if session is not None:
+            session.record(prompt, text, response)
+        return text
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         return "Error: Unexpected issue occurred"
 
-# Function to generate message history for sending to the model
-def generate_message_history(chat_history, system_prompt, prompt):
-    # Limit chat history to the last 5 exchanges for optimized payload
-    history_limit = 5
-    messages = [{"role": "system", "content": system_prompt}]
-    for message in chat_history[-history_limit:]:
-        if message["type"] == "assistant":
-            messages.append({"role": "assistant", "content": "```\n" + message["content"] + "\n```"})
-        else:
-            messages.append({"role": message["type"].lower(), "content": message["content"]})
-    messages.append({"role": "user", "content": prompt})
-    return messages
+# Function to get responses for many prompts at once; they are batched and answered in prompt order
+async def get_model_responses(prompts, chat_history, system_prompt, model_params=None):
+    responses = await asyncio.gather(*(get_model_response(prompt, chat_history, system_prompt, model_params) for prompt in prompts))
+    logging.info(f"Batch throughput: {model_request_queue.stats()}")
+    return responses
+
+# Function for headless batch generation, e.g. blender --background --python-expr
+def batch_generate(prompts, system_prompt="", model_params=None):
+    return asyncio.run(get_model_responses(prompts, [], system_prompt, model_params))
+
+# Function to start streaming the model response; returns an lm_client.StreamSubscription
+def start_response_stream(prompt, chat_history, system_prompt, model_params=None, session=None, conversation=None):
+    payload = request_payload(prompt, chat_history, system_prompt, model_params or DEFAULT_MODEL_PARAMS, session, conversation)
+    return lm_client.stream_in_background(LM_STUDIO_URL, payload)
+
+# Function to append text at the end of a text block, regardless of where the user's cursor is
+def append_to_text(text, chunk):
+    last_line = len(text.lines) - 1
+    last_character = len(text.lines[-1].body)
+    text.current_line_index = text.select_end_line_index = last_line
+    text.current_character = text.select_end_character = last_character
+    text.write(chunk)
+
+# Function to redraw every open text editor
+def redraw_text_editors():
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'TEXT_EDITOR':
+                area.tag_redraw()
+
+# Function to get the (emptied) text block that receives model responses, shown in a text editor
+def response_text_block(context):
+    text = bpy.data.texts.get(STREAM_TEXT_NAME) or bpy.data.texts.new(STREAM_TEXT_NAME)
+    text.clear()
+    show_text_in_editor(context, text)
+    return text
+
+# Function to show a text block in the first open text editor
+def show_text_in_editor(context, text):
+    for area in context.screen.areas:
+        if area.type == 'TEXT_EDITOR':
+            area.spaces.active.text = text
+            return
+    logging.info(f"Open a Text Editor to follow the response in '{text.name}'")
+
+# Function to generate message history for sending to the model.
+# The newest exchanges are packed into message_history.CONTEXT_TOKENS, leaving room for the reply.
+def generate_message_history(chat_history, system_prompt, prompt, max_tokens=0):
+    return message_history.build_messages(chat_history, system_prompt, prompt, reserve=max_tokens)
 
 # Function to handle chatbox commands
 def handle_chatbox_commands(command, chat_history):
@@ -183,11 +260,15 @@ def handle_chatbox_commands(command, chat_history):
 def init_props():
     bpy.types.Scene.gpt4_chat_input = bpy.props.StringProperty(name="Input", description="Enter your command here")
     bpy.types.Scene.gpt4_button_pressed = bpy.props.BoolProperty(default=False)
+    bpy.types.Scene.gpt4_stream_response = bpy.props.BoolProperty(name="Stream Response", description="Write tokens to the text editor as they are generated", default=True)
+    bpy.types.Scene.gpt4_reuse_prompt_cache = bpy.props.BoolProperty(name="Reuse Prompt Cache", description="Keep earlier turns unchanged so the server only processes the new prompt", default=False)
     bpy.types.Scene.gpt4_chat_history = bpy.props.CollectionProperty(type=bpy.types.PropertyGroup)
 
 def clear_props():
     del bpy.types.Scene.gpt4_chat_input
     del bpy.types.Scene.gpt4_button_pressed
+    del bpy.types.Scene.gpt4_stream_response
+    del bpy.types.Scene.gpt4_reuse_prompt_cache
     del bpy.types.Scene.gpt4_chat_history
 
 # Class definition for the Blender operator
@@ -200,27 +281,97 @@ class GPT4BlenderOperator(bpy.types.Operator):
             return {'CANCELLED'}
         context.scene.gpt4_button_pressed = True
         prompt = context.scene.gpt4_chat_input
-        loop = asyncio.get_event_loop()
-        ai_response = loop.run_in_executor(None, get_model_response, prompt, context.scene.gpt4_chat_history, "system message")
-        if ai_response:
-            context.scene.gpt4_chat_history.append({"role": "assistant", "content": ai_response})
-        else:
-            context.scene.gpt4_chat_history.append({"role": "assistant", "content": "Error connecting to AI server."})
-        text_editor = split_area_to_text_editor(context)
-        if len(context.scene.gpt4_chat_history) > 1:
-            text_editor.text = context.scene.gpt4_chat_history[-1]["content"]
-        context.scene.gpt4_button_pressed = False
+        session = get_chat_session("system message") if context.scene.gpt4_reuse_prompt_cache else None
+        if context.scene.gpt4_stream_response:
+            return self.execute_streaming(context, prompt, session)
+        scene = context.scene
+        text = response_text_block(context)
+
+        # Runs on the main thread once the background job has finished
+        def on_done(job):
+            ai_response = job.result if job.state == scheduler.DONE else "Error connecting to AI server."
+            # Error messages are shown but never become part of the conversation
+            if not ai_response.startswith("Error"):
+                chat_history.append({"type": "user", "content": prompt})
+                chat_history.append({"type": "assistant", "content": ai_response})
+            text.from_string(ai_response)
+            redraw_text_editors()
+            scene.gpt4_button_pressed = False
+
+        scheduler.default_scheduler.submit(get_model_response, prompt, list(chat_history), "system message", None, session, chat_conversation, name="gpt4_generate_response", on_done=on_done)
         return {'FINISHED'}
 
+    # Streaming runs modal: tokens are flushed on a window timer, Esc cancels the HTTP stream
+    def execute_streaming(self, context, prompt, session=None):
+        self.prompt = prompt
+        self.session = session
+        self.text = response_text_block(context)
+        self.subscription = start_response_stream(prompt, chat_history, "system message", session=session, conversation=chat_conversation)
+        self.parts = []
+        self.start_time = self.last_redraw = time.perf_counter()
+        self.timer = context.window_manager.event_timer_add(STREAM_FRAME_BUDGET, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            self.subscription.cancel()
+            return self.finish(context, cancelled=True)
+        if event.type != 'TIMER' or event.timer is not self.timer:
+            return {'PASS_THROUGH'}
+        chunk, finished = self.subscription.drain()
+        if chunk:
+            self.parts.append(chunk)
+            append_to_text(self.text, chunk)
+        now = time.perf_counter()
+        if finished or now - self.last_redraw >= STREAM_REDRAW_INTERVAL:
+            self.last_redraw = now
+            context.workspace.status_text_set(self.progress_text(now))
+            redraw_text_editors()
+        if finished:
+            return self.finish(context, cancelled=False)
+        return {'PASS_THROUGH'}
+
+    def progress_text(self, now):
+        elapsed = now - self.start_time
+        tokens = self.subscription.token_count
+        return f"Generating: {elapsed:.1f}s, {tokens} tokens, {tokens / elapsed:.1f} tokens/s (Esc to cancel)"
+
+    def finish(self, context, cancelled):
+        context.window_manager.event_timer_remove(self.timer)
+        context.workspace.status_text_set(None)
+        response = "".join(self.parts)
+        logging.info(f"{'Cancelled' if cancelled else 'Finished'}: {self.progress_text(time.perf_counter())}")
+        if self.subscription.error is not None:
+            # Shown in the text block only; the streamed reply itself stays free of it
+            append_to_text(self.text, f"\nError: {self.subscription.error}")
+        # Cancelled or failed replies are shown but never become part of the conversation
+        if not cancelled and self.subscription.error is None:
+            chat_history.append({"type": "user", "content": self.prompt})
+            chat_history.append({"type": "assistant", "content": response})
+            if self.session is not None:
+                self.session.record(self.prompt, response, self.subscription.stream.stats)
+        context.scene.gpt4_button_pressed = False
+        redraw_text_editors()
+        return {'CANCELLED'} if cancelled else {'FINISHED'}
+
 # Function to draw the panel in Blender UI
 def draw_panel(self, context):
     layout = self.layout
     layout.label(text="Blender GPT-4 Integration")
     layout.prop(context.scene, "gpt4_chat_input")
+    layout.prop(context.scene, "gpt4_stream_response")
+    layout.prop(context.scene, "gpt4_reuse_prompt_cache")
     layout.operator("wm.gpt4_generate_response", text="Generate Python Code")
 
 # Register functions to add the operator and panel to Blender UI
 def register():
+    cache_dir = bpy.utils.user_resource('CONFIG', path="ssd_mesh_extension", create=True)
+    response_cache.configure(path=os.path.join(cache_dir, "response_cache.sqlite"))
+    if ENABLE_SEMANTIC_CACHE:
+        semantic_cache.configure(directory=os.path.join(cache_dir, "semantic_cache"))
+    kv_snapshots.configure(os.path.join(cache_dir, "kv_snapshots"))
+    endpoint_pool.configure(LM_STUDIO_ENDPOINTS)
     bpy.utils.register_class(GPT4BlenderOperator)
     init_props()
     bpy.types.VIEW3D_PT_tools_object.append(draw_panel)
@@ -230,6 +381,11 @@ def unregister():
     bpy.utils.unregister_class(GPT4BlenderOperator)
     clear_props()
     bpy.types.VIEW3D_PT_tools_object.remove(draw_panel)
+    scheduler.default_scheduler.shutdown()
+    endpoint_pool.shutdown()
+    lm_client.close_session()
+    model_registry.default_registry.clear()
+    response_cache.default_cache.close()
 
 # Run these functions if this script is executed as the main module
 if __name__ == "__main__":
@@ -1,16 +1,12 @@
 import bpy
 import requests
-from llama_cpp import Model, Context, Token
-from oneapi import dpctl
-from openvino.runtime import Core
 import asyncio
 import logging
-import numpy as np
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
-from openml import datasets
+import threading
+from . import kv_snapshots, lm_client, model_registry, openvino_pool, scheduler
 
 # Configuration Parameters
-API_URL = "http://127.0.0.1:5000/v1/chat/completions"
+API_URL = "http://localhost:5000/v1/chat/completions"
 HEADERS = {
     "Content-Type": "application/json",
     "Authorization": "Bearer your_token_here"  # Replace with an actual token if required
@@ -19,15 +15,38 @@ DEFAULT_MODEL = "llama"
 TEMPERATURE = 0.7
 MAX_TOKENS = 512
 
-# Initialize LLaMA model using llama-cpp-python
-model_path = "path/to/your/model.bin"
-context = Context()
-model = Model(model_path, context)
+# Local models, loaded on first use rather than when the add-on is enabled
+LLAMA_MODEL_PATH = "path/to/your/model.gguf"  # LLaMA model for llama-cpp-python
+LLAMA_CONTEXT_TOKENS = 4096
+# Fixed prompt prefix of every local generation; its evaluated state is restored from kv_snapshots
+LOCAL_SYSTEM_PROMPT = (
+    "You are an expert Blender Python developer. Rewrite the answer below as one complete, runnable "
+    "Blender Python script that uses bpy only, with no explanations outside code comments.\n\n"
+)
+OPENVINO_MODEL_PATH = "llama_openvino_model.xml"  # Compiled for openvino_pool.DEVICE (e.g. "GPU" for an Intel A750)
 
-# Initialize OpenVINO for inference on Intel A750 GPU
-core = Core()
-model_name = "llama_openvino_model.xml"
-compiled_model = core.compile_model(model_name, device_name="GPU")
+# Define a function to load the LLaMA model with llama-cpp-python
+def load_llama_model():
+    from llama_cpp import Llama
+    return Llama(model_path=LLAMA_MODEL_PATH, n_ctx=LLAMA_CONTEXT_TOKENS, verbose=False)
+
+# The llama.cpp context holds one sequence, so generations on the shared model take turns
+_llama_lock = threading.Lock()
+
+# Define a function to compile the OpenVINO model with the add-on's device and performance hint
+def load_compiled_model():
+    return openvino_pool.compile_model(OPENVINO_MODEL_PATH)
+
+model_registry.default_registry.register("llama", load_llama_model)
+model_registry.default_registry.register("openvino", load_compiled_model)
+
+# Define a function to get the shared LLaMA model, loading it on first use
+def get_llama_model():
+    return model_registry.default_registry.get("llama")
+
+# Define a function to get the shared compiled OpenVINO model, compiling it on first use
+def get_compiled_model():
+    return model_registry.default_registry.get("openvino")
 
 # Define a function to query the LM Studio API
 async def query_lm_studio(prompt, model=DEFAULT_MODEL):
@@ -37,11 +56,10 @@ async def query_lm_studio(prompt, model=DEFAULT_MODEL):
         "temperature": TEMPERATURE,
         "max_tokens": MAX_TOKENS
     }
-    response = await asyncio.to_thread(requests.post, API_URL, headers=HEADERS, json=payload)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        logging.error(f"Error: {response.status_code}, {response.text}")
+    try:
+        return await asyncio.to_thread(lm_client.post_json, API_URL, payload, HEADERS)
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error: {e}")
         return None
 
 # Define a function to generate Blender code using the LLaMA model
@@ -50,11 +68,19 @@ async def generate_blender_code(prompt):
     ai_response = await query_lm_studio(prompt)
     if not ai_response:
         return None
-    # Convert AI response to Blender code using LLaMA model
-    tokens = Token.from_string(ai_response["choices"][0]["message"]["content"])
-    generated_code = model.generate(tokens, TEMPERATURE, MAX_TOKENS)
+    # Local models load and run in a worker thread so the scheduler loop stays free
+    return await asyncio.to_thread(refine_with_local_models, ai_response["choices"][0]["message"]["content"])
+
+# Define a function to turn an LM Studio answer into Blender code with the local models
+def refine_with_local_models(content):
+    model = get_llama_model()
+    # Convert AI response to Blender code using LLaMA model; the system prompt is not evaluated again
+    with _llama_lock:
+        kv_snapshots.restore_prefix(model, LLAMA_MODEL_PATH, LOCAL_SYSTEM_PROMPT)
+        completion = model.create_completion(LOCAL_SYSTEM_PROMPT + content, temperature=TEMPERATURE, max_tokens=MAX_TOKENS)
+    generated_code = completion["choices"][0]["text"]
     # Optimize code on Intel GPU using OpenVINO
-    optimized_code = compiled_model(generated_code)
+    optimized_code = get_compiled_model()(generated_code)
     return optimized_code
 
 # Define a custom Blender panel
@@ -79,15 +105,18 @@ class AIQueryOperator(bpy.types.Operator):
     def execute(self, context):
         prompt = context.scene.get("ai_prompt", "")
         if prompt:
-            loop = asyncio.get_event_loop()
-            code = loop.run_in_executor(None, generate_blender_code, prompt)
-            if code:
-                print(f"Generated Blender Code:\n{code}")
-                # Add generated code to the scene or use it as needed
-            else:
-                print("Error generating Blender code")
+            scheduler.default_scheduler.submit(generate_blender_code, prompt, on_done=self.on_code_generated)
         return {"FINISHED"}
 
+    # Called on the main thread once generate_blender_code has finished
+    @staticmethod
+    def on_code_generated(job):
+        if job.state == scheduler.DONE and job.result:
+            print(f"Generated Blender Code:\n{job.result}")
+            # Add generated code to the scene or use it as needed
+        else:
+            print("Error generating Blender code")
+
 # Register Blender classes and operators
 def register():
     bpy.types.Scene.ai_prompt = bpy.props.StringProperty(name="AI Prompt")
@@ -0,0 +1,133 @@
+import time
+import queue
+import weakref
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+import numpy as np
+
+# Batching settings for local inference: largest batch, how long the first request may wait for company
+MAX_BATCH_SIZE = 8
+MAX_QUEUE_DELAY = 0.005  # Seconds
+IDLE_TIMEOUT = 30.0  # Seconds before an idle worker thread exits (restarted on the next submit)
+
+# Define a function to pad arrays to a common shape (beyond the first axis) and stack them along axis 0.
+# Returns the batch and the number of rows each input contributed.
+def pad_and_stack(arrays, pad_value=0):
+    target = np.max([array.shape[1:] for array in arrays], axis=0) if arrays[0].ndim > 1 else ()
+    padded = []
+    for array in arrays:
+        if array.shape[1:] != tuple(target):
+            widths = [(0, 0)] + [(0, size - current) for size, current in zip(target, array.shape[1:])]
+            array = np.pad(array, widths, constant_values=pad_value)
+        padded.append(array)
+    return np.concatenate(padded), [len(array) for array in arrays]
+
+# Collects concurrent inference calls into batches for one in-process model. Requests wait at most
+# max_queue_delay for others, are padded and stacked into one array of up to max_batch_size rows,
+# run through `run_batch` in one forward pass and split back to their callers. Several workers
+# (e.g. one per OpenVINO infer request) can run batches at the same time. With `rank` (the model
+# input's number of dimensions) an input of lower rank is one sample: it gets a leading batch axis,
+# which is removed again from its result.
+class BatchingExecutor:
+    def __init__(self, run_batch, max_batch_size=MAX_BATCH_SIZE, max_queue_delay=MAX_QUEUE_DELAY, workers=1, pad_value=0, rank=None):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_queue_delay = max_queue_delay
+        self.workers = workers
+        self.pad_value = pad_value
+        self.rank = rank
+        self.histogram = Counter()  # Batch size -> number of batches run
+        self._queue = queue.Queue()
+        self._running = 0
+        self._lock = threading.Lock()
+
+    # Queue one input (leading axis = rows, or a single sample below `rank`) and return a Future
+    # of its rows of the batch output
+    def submit(self, data):
+        future = Future()
+        data = np.asarray(data)
+        sample = self.rank is not None and data.ndim < self.rank
+        self._queue.put((np.expand_dims(data, 0) if sample else data, future, sample))
+        with self._lock:
+            if self._running < self.workers:
+                self._running += 1
+                threading.Thread(target=self._work, name="batch-executor", daemon=True).start()
+        return future
+
+    # Run one input, batched with whatever else arrives meanwhile
+    def infer(self, data):
+        return self.submit(data).result()
+
+    def _work(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=IDLE_TIMEOUT)]
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._running -= 1
+                        return
+                continue
+            rows = len(batch[0][0])
+            deadline = time.monotonic() + self.max_queue_delay
+            while rows < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            self._run(batch)
+
+    def _run(self, batch):
+        arrays = [data for data, _, _ in batch]
+        futures = [future for _, future, _ in batch]
+        try:
+            stacked, counts = pad_and_stack(arrays, self.pad_value)
+            outputs = np.asarray(self.run_batch(stacked))
+        except Exception as e:
+            logging.error(f"Batched inference of {len(batch)} requests failed: {e}")
+            for future in futures:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self.histogram[len(stacked)] += 1
+        start = 0
+        for (array, future, sample), count in zip(batch, counts):
+            result = outputs[start:start + count]
+            # Outputs that kept the padded sequence length are trimmed back to the caller's length
+            if array.ndim > 1 and result.ndim > 1 and stacked.shape[1] != array.shape[1] and result.shape[1] == stacked.shape[1]:
+                result = result[:, :array.shape[1]]
+            future.set_result(result[0] if sample else result)
+            start += count
+
+    # Return batch counts and the batch-size histogram, for tuning max_batch_size and max_queue_delay
+    def stats(self):
+        with self._lock:
+            histogram = dict(sorted(self.histogram.items()))
+        batches = sum(histogram.values())
+        rows = sum(size * count for size, count in histogram.items())
+        return {
+            "batches": batches,
+            "rows": rows,
+            "mean_batch_size": rows / batches if batches else 0.0,
+            "histogram": histogram,
+        }
+
+_executors = weakref.WeakKeyDictionary()
+_executors_lock = threading.Lock()
+
+# Define a function to get the batching executor of a model, creating it with `run_batch(model, batch)`
+# on first use. The executor only holds a weak reference, so it goes away with its model.
+def executor_for(model, run_batch, **options):
+    with _executors_lock:
+        executor = _executors.get(model)
+        if executor is None:
+            model_ref = weakref.ref(model)
+            executor = _executors[model] = BatchingExecutor(lambda batch: run_batch(model_ref(), batch), **options)
+        return executor
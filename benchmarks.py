@@ -0,0 +1,167 @@
+# Performance benchmarks for the add-on.
+# Run inside Blender:  blender --background --python benchmarks.py -- [benchmark names]
+# Benchmarks that do not need bpy also run with plain Python:  python benchmarks.py [benchmark names]
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import mesh_io
+import model_registry
+
+# Define a function to build OBJ text for a triangulated grid with the given number of faces
+def grid_obj_text(face_count):
+    side = int(np.ceil(np.sqrt(face_count / 2)))
+    x, y = np.meshgrid(np.arange(side + 1), np.arange(side + 1))
+    vertices = np.column_stack([x.ravel(), y.ravel(), np.zeros(x.size)])
+    corner = (np.arange(side)[None, :] + np.arange(side)[:, None] * (side + 1)).ravel() + 1
+    quads = np.column_stack([corner, corner + 1, corner + side + 2, corner + side + 1])
+    triangles = np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]])[:face_count]
+    lines = [f"v {x:g} {y:g} {z:g}" for x, y, z in vertices]
+    lines += [f"f {a} {b} {c}" for a, b, c in triangles]
+    return "\n".join(lines) + "\n"
+
+# Define a function to time a callable, returning the best of `repeat` runs in seconds
+def timed(function, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# Define a benchmark comparing in-memory foreach_set mesh creation with the OBJ import operator
+def benchmark_import_mesh(face_counts=(1000, 10000, 100000)):
+    import bpy
+    obj_import = bpy.ops.wm.obj_import if hasattr(bpy.ops.wm, "obj_import") else bpy.ops.import_scene.obj
+    print("faces      in-memory (ms)   operator (ms)   speedup")
+    for face_count in face_counts:
+        text = grid_obj_text(face_count)
+        with tempfile.NamedTemporaryFile("w", suffix=".obj", delete=False) as obj_file:
+            obj_file.write(text)
+
+        def in_memory():
+            bpy.data.meshes.remove(mesh_io.mesh_from_obj("benchmark", text))
+
+        def operator():
+            obj_import(filepath=obj_file.name)
+            for mesh_object in list(bpy.context.selected_objects):
+                mesh = mesh_object.data
+                bpy.data.objects.remove(mesh_object, do_unlink=True)
+                bpy.data.meshes.remove(mesh)
+
+        in_memory_time = timed(in_memory)
+        operator_time = timed(operator)
+        os.remove(obj_file.name)
+        print(f"{face_count:<10} {in_memory_time * 1000:>14.1f} {operator_time * 1000:>15.1f} {operator_time / in_memory_time:>9.1f}x")
+
+# Define a benchmark comparing the vectorized OBJ parser with the line-by-line fallback (no bpy needed)
+def benchmark_parse_obj(face_counts=(1000, 10000, 100000)):
+    print("faces      vectorized (ms)   per-line (ms)   speedup")
+    for face_count in face_counts:
+        text = grid_obj_text(face_count)
+        vectorized_time = timed(lambda: mesh_io.parse_obj(text))
+        per_line_time = timed(lambda: mesh_io._parse_lines(text))
+        print(f"{face_count:<10} {vectorized_time * 1000:>15.1f} {per_line_time * 1000:>15.1f} {per_line_time / vectorized_time:>9.1f}x")
+
+# Define a benchmark of mesh_io.repair_mesh on grid meshes with duplicated vertices, degenerate
+# faces, bad indices and half of the faces flipped (no bpy needed)
+def benchmark_repair_mesh(face_counts=(1000, 10000, 100000)):
+    rng = np.random.default_rng(0)
+    print("faces      repair (ms)   fixes")
+    for face_count in face_counts:
+        vertices, loops, face_sizes = mesh_io.parse_obj(grid_obj_text(face_count))
+        triangles = loops.reshape(-1, 3).copy()
+        flipped = rng.random(len(triangles)) < 0.5
+        triangles[flipped] = triangles[flipped, ::-1]
+        extra = [[0, 0, 1], [0, 1, len(vertices) + 10], [0, 1, len(vertices)]]  # Repeated, out of range, duplicate vertex
+        loops = np.concatenate([triangles.ravel(), np.ravel(extra)]).astype(np.int32)
+        face_sizes = np.append(face_sizes, [3] * len(extra)).astype(np.int32)
+        vertices = np.concatenate([vertices, vertices[2:3]])
+        elapsed = timed(lambda: mesh_io.repair_mesh(vertices, loops, face_sizes))
+        print(f"{face_count:<10} {elapsed * 1000:>11.1f}   {dict(mesh_io.repair_mesh(vertices, loops, face_sizes)[3])}")
+
+# Define a benchmark measuring the wall time and resident memory of importing and registering the add-on.
+# Run it in a fresh Blender with the add-on disabled, otherwise the import is already cached.
+def benchmark_register():
+    import importlib
+    addon_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(addon_dir))
+    rss_before = model_registry.resident_memory()
+    start = time.perf_counter()
+    addon = importlib.import_module(os.path.basename(addon_dir))
+    imported = time.perf_counter()
+    addon.register()
+    registered = time.perf_counter()
+    rss_after = model_registry.resident_memory()
+    addon.unregister()
+    print(f"import: {(imported - start) * 1000:.1f} ms, register(): {(registered - imported) * 1000:.1f} ms, total: {(registered - start) * 1000:.1f} ms")
+    if rss_before is not None:
+        print(f"RSS: {rss_before / 2**20:.1f} MB -> {rss_after / 2**20:.1f} MB (+{(rss_after - rss_before) / 2**20:.1f} MB)")
+
+# Define a benchmark of OpenVINO inferences/s on the CPU: a new infer request per call (the old
+# infer_with_openvino) against openvino_pool.InferencePool at several concurrency levels.
+# Uses a generated MLP, so no model file is needed.
+def benchmark_openvino_pool(concurrency_levels=(1, 2, 4, 8), inferences=2000, width=1024):
+    import openvino as ov
+    import openvino.opset13 as ops
+    import openvino_pool
+    parameter = ops.parameter([1, width], np.float32, name="input")
+    hidden = ops.relu(ops.matmul(parameter, ops.constant(np.random.rand(width, width).astype(np.float32)), False, False))
+    model = ov.Model([ops.matmul(hidden, ops.constant(np.random.rand(width, width).astype(np.float32)), False, False)], [parameter])
+    inputs = [np.random.rand(1, width).astype(np.float32) for _ in range(inferences)]
+    for mode in ("LATENCY", "THROUGHPUT"):
+        compiled_model = ov.Core().compile_model(model, "CPU", {"PERFORMANCE_HINT": mode})
+        print(f"{mode} hint (optimal infer requests: {compiled_model.get_property('OPTIMAL_NUMBER_OF_INFER_REQUESTS')})")
+        baseline = timed(lambda: [compiled_model.create_infer_request().infer({0: data}) for data in inputs], repeat=1)
+        print(f"  new request per call  {inferences / baseline:>10.0f} inferences/s")
+        for concurrency in concurrency_levels:
+            pool = openvino_pool.InferencePool(compiled_model, size=concurrency)
+            pool.map(inputs[:concurrency])  # Warm-up
+            elapsed = timed(lambda: pool.map(inputs), repeat=1)
+            print(f"  pool of {concurrency:<13} {inferences / elapsed:>10.0f} inferences/s")
+
+# Define a benchmark of the time to a valid mesh: single requests against races of several candidates
+# (mesh_stream.MeshRace). Needs Blender and a running LM Studio server; responses are not cached.
+def benchmark_mesh_race(candidate_counts=(1, 2, 4), rounds=10, prompt="Create a 3D obj file using the following description: a chair"):
+    import importlib
+    addon_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(addon_dir))
+    package = os.path.basename(addon_dir)
+    utilities = importlib.import_module(package + ".utilities")
+    mesh_stream = importlib.import_module(package + ".mesh_stream")
+    report = mesh_stream.LatencyReport()
+    for count in candidate_counts:
+        mode = "single" if count == 1 else f"race of {count}"
+        for _ in range(rounds):
+            payload = utilities.mesh_payload(prompt)
+            if count == 1:
+                generation = mesh_stream.MeshStream(utilities.LM_STUDIO_API_URL, payload, utilities.LM_STUDIO_HEADERS, use_cache=False)
+            else:
+                generation = mesh_stream.MeshRace(utilities.LM_STUDIO_API_URL, payload, utilities.LM_STUDIO_HEADERS, candidates=count, use_cache=False)
+            while not generation.poll():
+                time.sleep(0.01)
+            report.record(mode, generation.elapsed, generation.valid())
+    print("mode          valid   mean (s)   p50 (s)   p90 (s)   max (s)")
+    for mode, stats in report.stats().items():
+        print(f"{mode:<13} {stats['validity_rate']:>5.0%} {stats['mean']:>10.2f} {stats['p50']:>9.2f} {stats['p90']:>9.2f} {stats['max']:>9.2f}")
+
+BENCHMARKS = {
+    "import_mesh": benchmark_import_mesh,
+    "parse_obj": benchmark_parse_obj,
+    "repair_mesh": benchmark_repair_mesh,
+    "register": benchmark_register,
+    "openvino_pool": benchmark_openvino_pool,
+    "mesh_race": benchmark_mesh_race,
+}
+
+if __name__ == "__main__":
+    if "--" in sys.argv:
+        names = sys.argv[sys.argv.index("--") + 1:]
+    else:
+        names = [name for name in sys.argv[1:] if not name.endswith(".py")]
+    for name in names or BENCHMARKS:
+        print(f"== {name}")
+        BENCHMARKS[name]()
@@ -0,0 +1,176 @@
+import json
+import hashlib
+import logging
+import threading
+import requests
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from . import lm_client, resilience
+
+# OpenAI-compatible servers sharing the load, as (base URL, weight) pairs
+ENDPOINTS = [("http://localhost:5000", 1.0)]
+EWMA_ALPHA = 0.3  # Weight of the newest latency sample in each endpoint's moving average
+HEALTH_CHECK_INTERVAL = 30.0  # Seconds between background health checks
+HEALTH_CHECK_PATH = "/v1/models"
+MAX_SESSIONS = 256  # Chat sessions remembered for backend stickiness
+LOOPBACK_HOSTS = ("localhost", "127.0.0.1", "::1")  # Spellings of the local machine, matched as one host
+
+# Define a function to get the scheme://host:port part of a URL
+def origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+# Define a function to get the key a URL's server is matched by: its origin with the host lowercased
+# and loopback spellings folded together, so "127.0.0.1" at a call site matches a pooled "localhost"
+def origin_key(url):
+    parts = urlsplit(url)
+    host = "localhost" if parts.hostname in LOOPBACK_HOSTS else parts.hostname
+    port = parts.port or {"http": 80, "https": 443}.get(parts.scheme)
+    return f"{parts.scheme}://{host}:{port}"
+
+# Define a function to derive a chat session key from a payload: the system prompt plus the
+# conversation id sent in the OpenAI "user" field. Both stay fixed for a whole conversation, while the
+# turns in between change as the history window slides. Requests without an id are not sticky.
+def session_key(payload):
+    payload = payload or {}
+    conversation = payload.get("user")
+    if conversation is None:
+        return None
+    messages = payload.get("messages") or []
+    system_prompt = next((message.get("content") for message in messages if message.get("role") == "system"), None)
+    key = json.dumps([payload.get("model"), system_prompt, conversation], sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+# One backend server with its load and latency statistics
+class Endpoint:
+    def __init__(self, url, weight=1.0):
+        self.url = url.rstrip("/")
+        self.weight = weight
+        self.outstanding = 0
+        self.latency = None  # EWMA of the time to first token in seconds, None until the first streamed token
+        self.healthy = True
+        self.requests = 0
+
+    # Healthy and not rejected by its circuit breaker
+    @property
+    def available(self):
+        return self.healthy and resilience.breaker_for(self.url).state != resilience.CircuitBreaker.OPEN
+
+    def __repr__(self):
+        return f"<Endpoint {self.url} weight={self.weight} outstanding={self.outstanding}>"
+
+# Balances requests over several servers. A request goes to the available endpoint with the lowest
+# (outstanding + 1) * latency / weight, i.e. least outstanding requests scaled by EWMA latency and
+# weight. Requests of the same chat session stick to one endpoint so its prompt cache stays warm.
+class EndpointPool:
+    def __init__(self, endpoints=ENDPOINTS, health_check_interval=HEALTH_CHECK_INTERVAL):
+        self.endpoints = [Endpoint(url, weight) for url, weight in endpoints]
+        self.health_check_interval = health_check_interval
+        self._by_origin = {origin_key(endpoint.url): endpoint for endpoint in self.endpoints}
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._health_thread = None
+
+    # True when the URL points at one of the pooled servers
+    def __contains__(self, url):
+        return origin_key(url) in self._by_origin
+
+    # Pick an endpoint for a request and count it as outstanding until release()
+    def acquire(self, session=None):
+        with self._lock:
+            candidates = [endpoint for endpoint in self.endpoints if endpoint.available] or self.endpoints
+            endpoint = self._sessions.get(session) if session is not None else None
+            if endpoint not in candidates:
+                # Endpoints without samples yet are assumed as fast as the fastest one, so they get tried
+                known = [candidate.latency for candidate in candidates if candidate.latency is not None]
+                default_latency = min(known) if known else 1.0
+                endpoint = min(candidates, key=lambda candidate: (candidate.outstanding + 1) * (candidate.latency or default_latency) / candidate.weight)
+            if session is not None:
+                self._sessions[session] = endpoint
+                self._sessions.move_to_end(session)
+                if len(self._sessions) > MAX_SESSIONS:
+                    self._sessions.popitem(last=False)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+        return endpoint
+
+    # Finish a request on an endpoint, folding its time to first token (seconds) into the moving average
+    def release(self, endpoint, latency=None):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if latency is not None:
+                endpoint.latency = latency if endpoint.latency is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * endpoint.latency
+
+    # Query every endpoint's health path and mark it healthy or not
+    def check_health(self):
+        for endpoint in self.endpoints:
+            try:
+                response = lm_client.get_session().get(endpoint.url + HEALTH_CHECK_PATH, timeout=resilience.CONNECT_TIMEOUT)
+                response.close()
+                healthy = response.status_code not in (502, 503, 504)
+            except requests.exceptions.RequestException:
+                healthy = False
+            if healthy != endpoint.healthy:
+                logging.warning(f"Endpoint {endpoint.url} is {'healthy' if healthy else 'unhealthy'}")
+            endpoint.healthy = healthy
+
+    def _health_loop(self):
+        self.check_health()
+        while not self._stop_event.wait(self.health_check_interval):
+            self.check_health()
+
+    # Start checking endpoint health on a background thread
+    def start_health_checks(self):
+        if self._health_thread is None and len(self.endpoints) > 1:
+            self._health_thread = threading.Thread(target=self._health_loop, name="endpoint-health", daemon=True)
+            self._health_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    # Return per-endpoint load and latency figures
+    def stats(self):
+        with self._lock:
+            return [{
+                "url": endpoint.url,
+                "weight": endpoint.weight,
+                "healthy": endpoint.available,
+                "outstanding": endpoint.outstanding,
+                "requests": endpoint.requests,
+                "latency": endpoint.latency,
+            } for endpoint in self.endpoints]
+
+# Shared pool used by lm_client; None until configure() is called, in which case URLs are used as-is
+default_pool = None
+
+# Define a function to set the pooled endpoints as (base URL, weight) pairs
+def configure(endpoints=ENDPOINTS, health_check_interval=HEALTH_CHECK_INTERVAL):
+    global default_pool
+    shutdown()
+    default_pool = EndpointPool(endpoints, health_check_interval)
+    default_pool.start_health_checks()
+    logging.info(f"Endpoint pool configured: {', '.join(f'{url} (weight {weight})' for url, weight in endpoints)}")
+    return default_pool
+
+# Define a function to stop the shared pool's health checks (called on add-on unregister)
+def shutdown():
+    global default_pool
+    if default_pool is not None:
+        default_pool.stop()
+    default_pool = None
+
+# Define a function to choose the server for a request. Returns (endpoint, url): URLs on a pooled
+# server are rewritten to the chosen endpoint, any other URL comes back unchanged with endpoint None.
+def route(url, payload=None):
+    pool = default_pool
+    if pool is None or url not in pool:
+        return None, url
+    endpoint = pool.acquire(session_key(payload))
+    return endpoint, endpoint.url + url[len(origin(url)):]
+
+# Define a function to finish a request returned by route()
+def release(endpoint, latency=None):
+    pool = default_pool
+    if endpoint is not None and pool is not None and endpoint in pool.endpoints:
+        pool.release(endpoint, latency)
@@ -0,0 +1,117 @@
+import os
+import pickle
+import hashlib
+import logging
+import threading
+import numpy as np
+
+# Disk budget for saved prompt states; least recently used snapshots are deleted beyond it
+DISK_MAX_BYTES = 4 * 2**30
+FINGERPRINT_BYTES = 1 << 20  # Bytes of the model file hashed (the GGUF header and metadata)
+
+_fingerprints = {}
+
+# Define a function to fingerprint a model file by its size and leading bytes (cached per path and mtime)
+def model_fingerprint(model_path):
+    stat = os.stat(model_path)
+    cache_key = (model_path, stat.st_size, stat.st_mtime_ns)
+    if cache_key not in _fingerprints:
+        digest = hashlib.sha256(str(stat.st_size).encode("ascii"))
+        with open(model_path, "rb") as model_file:
+            digest.update(model_file.read(FINGERPRINT_BYTES))
+        _fingerprints[cache_key] = digest.hexdigest()
+    return _fingerprints[cache_key]
+
+# Define a function to compute the snapshot key of a token prefix evaluated by a model.
+# The context size is part of the key because the saved KV state depends on it.
+def snapshot_key(model_hash, n_ctx, tokens):
+    prefix_hash = hashlib.sha256(np.asarray(tokens, dtype=np.int32).tobytes()).hexdigest()
+    return f"{model_hash[:16]}-{n_ctx}-{prefix_hash[:16]}"
+
+# Saved llama.cpp states (llama_cpp.LlamaState) on disk, one file per key, pruned in LRU order.
+# States are pickled, as llama-cpp-python's own LlamaDiskCache does.
+class SnapshotStore:
+    def __init__(self, directory, max_bytes=DISK_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".state")
+
+    # Return the saved state for a key, or None
+    def load(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as state_file:
+                state = pickle.load(state_file)
+            os.utime(path)  # Mark as recently used
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            if os.path.exists(path):
+                logging.warning(f"Discarding unreadable prompt snapshot {key}: {e}")
+                os.remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return state
+
+    # Save a state, then delete the least recently used snapshots beyond the disk budget
+    def save(self, key, state):
+        path = self._path(key)
+        with self._lock:
+            with open(path + ".tmp", "wb") as state_file:
+                pickle.dump(state, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + ".tmp", path)
+            self.prune()
+
+    def prune(self):
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".state"):
+                stat = os.stat(os.path.join(self.directory, name))
+                snapshots.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in snapshots)
+        for _, size, name in sorted(snapshots):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+            logging.info(f"Deleted prompt snapshot {name} to stay within the disk budget")
+
+    def stats(self):
+        sizes = [os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory) if name.endswith(".state")]
+        return {"hits": self.hits, "misses": self.misses, "snapshots": len(sizes), "bytes": sum(sizes)}
+
+# Shared store; None until configure() is called, in which case prefixes are only reused in memory
+default_store = None
+
+# Define a function to enable saving prompt snapshots under `directory`
+def configure(directory, max_bytes=DISK_MAX_BYTES):
+    global default_store
+    default_store = SnapshotStore(directory, max_bytes)
+    return default_store
+
+# Define a function to bring a llama_cpp.Llama model to the state right after evaluating `prefix`.
+# Uses the model's current state when it already starts with the prefix, else a saved snapshot,
+# else evaluates the prefix and saves the result. Later completions whose prompt starts with the
+# prefix only evaluate the rest (llama-cpp-python reuses the longest matching token prefix).
+def restore_prefix(model, model_path, prefix, store=None):
+    store = store or default_store
+    tokens = model.tokenize(prefix.encode("utf-8"))
+    if model.n_tokens >= len(tokens) and np.array_equal(model.input_ids[:len(tokens)], tokens):
+        return tokens
+    key = snapshot_key(model_fingerprint(model_path), model.n_ctx(), tokens) if store is not None else None
+    state = store.load(key) if store is not None else None
+    if state is not None:
+        model.load_state(state)
+        logging.info(f"Restored {len(tokens)}-token prompt prefix from snapshot {key}")
+        return tokens
+    model.reset()
+    model.eval(tokens)
+    if store is not None:
+        store.save(key, model.save_state())
+        logging.info(f"Saved {len(tokens)}-token prompt prefix as snapshot {key}")
+    return tokens
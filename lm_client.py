@@ -0,0 +1,359 @@
+import json
+import time
+import queue
+import socket
+import threading
+from concurrent.futures import Future
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from . import endpoint_pool, resilience, response_cache, semantic_cache
+
+# Connection pool settings for the shared LM Studio client
+POOL_CONNECTIONS = 4  # Number of distinct endpoints (host:port) kept alive
+POOL_MAXSIZE = 8  # Keep-alive connections kept per endpoint
+
+_session = None
+_session_lock = threading.Lock()
+
+# Requests currently in flight, keyed by endpoint and canonical payload; identical callers share them
+_inflight = {}
+_inflight_lock = threading.Lock()
+coalesced_requests = 0
+
+# Define a function to build a requests session with a keep-alive connection pool
+def create_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+    session = requests.Session()
+    # urllib3 keys its pools on scheme/host/port, so each endpoint reuses its own connections
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+# Define a function to get the module-level session, creating it on first use
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+# Define a function to resize the connection pool (replaces the shared session)
+def configure_pool(pool_connections=None, pool_maxsize=None):
+    global _session, POOL_CONNECTIONS, POOL_MAXSIZE
+    with _session_lock:
+        POOL_CONNECTIONS = pool_connections or POOL_CONNECTIONS
+        POOL_MAXSIZE = pool_maxsize or POOL_MAXSIZE
+        old_session, _session = _session, create_session(POOL_CONNECTIONS, POOL_MAXSIZE)
+    if old_session is not None:
+        old_session.close()
+    logging.info(f"LM Studio pool configured: {POOL_CONNECTIONS} endpoints x {POOL_MAXSIZE} connections")
+
+# Define a function to close all pooled connections (called on add-on unregister)
+def close_session():
+    global _session
+    with _session_lock:
+        old_session, _session = _session, None
+    if old_session is not None:
+        old_session.close()
+
+# Define a function to POST to an LM Studio endpoint over the shared pool
+def post(url, json=None, headers=None, timeout=None, stream=False):
+    return get_session().post(url, json=json, headers=headers, timeout=timeout, stream=stream)
+
+# Define a function to look a payload up in the exact cache, then in the semantic index
+def cached_response(payload, key):
+    cached = response_cache.default_cache.get(key)
+    if cached is None and semantic_cache.default_index is not None:
+        cached = semantic_cache.default_index.lookup(payload)
+    return cached
+
+# Define a function to record a fresh response in the exact cache and the semantic index.
+# A storage failure (disk full, locked database) only costs the cache entry, never the response.
+def store_response(payload, key, value):
+    try:
+        response_cache.default_cache.put(key, value)
+        if semantic_cache.default_index is not None:
+            semantic_cache.default_index.store(payload, value)
+    except Exception as e:
+        logging.warning(f"Response not cached: {e}")
+
+# Define a function to join an identical in-flight request, or register a new one; returns (flight, is_leader)
+def join_flight(flight_key, new_flight):
+    global coalesced_requests
+    with _inflight_lock:
+        flight = _inflight.get(flight_key)
+        if flight is not None and not flight.cancelled():
+            coalesced_requests += 1
+            return flight, False
+        flight = _inflight[flight_key] = new_flight()
+        return flight, True
+
+# Define a function to forget a finished in-flight request (unless a newer one replaced it)
+def end_flight(flight_key, flight):
+    with _inflight_lock:
+        if _inflight.get(flight_key) is flight:
+            del _inflight[flight_key]
+
+# Define a function to POST a completion request and return its JSON, served from the caches when possible.
+# Identical requests made while this one is running wait for it instead of hitting the server again.
+def post_json(url, payload, headers=None, use_cache=True, attempts=None, deadline=None):
+    key = response_cache.cache_key(payload)
+    if use_cache:
+        cached = cached_response(payload, key)
+        if cached is not None:
+            return json.loads(cached)
+    flight_key = ("post", url, key)
+    flight, leader = join_flight(flight_key, Future)
+    if not leader:
+        return json.loads(flight.result())
+    # Only counted as outstanding: the whole-request time of a blocking call is not comparable to
+    # the time to first token the pool ranks endpoints by
+    endpoint, target = endpoint_pool.route(url, payload)
+    try:
+        response = resilience.call(
+            target, lambda timeout: post(target, json=payload, headers=headers, timeout=timeout),
+            attempts or resilience.MAX_ATTEMPTS, deadline or resilience.DEFAULT_DEADLINE)
+        response.raise_for_status()
+        if use_cache:
+            store_response(payload, key, response.text)
+        flight.set_result(response.text)
+        return response.json()
+    except BaseException as e:
+        flight.set_exception(e)
+        raise
+    finally:
+        endpoint_pool.release(endpoint)
+        end_flight(flight_key, flight)
+
+# Define a function to pull the generated text out of a chat, completion or /generate response
+def completion_text(response, default=None):
+    choice = (response.get("choices") or [{}])[0]
+    return choice.get("message", {}).get("content") or choice.get("text") or response.get("text") or default
+
+# Define a function to parse one Server-Sent Events line (same rules as openai.api_requestor.parse_stream_helper)
+def parse_stream_line(line):
+    if line and line.startswith(b"data:"):
+        return line[len(b"data:"):].strip().decode("utf-8")
+    return None
+
+# Define a function to iterate over the data payloads of an SSE response, stopping at [DONE]
+# (`on_done` is called when it arrives, telling a complete stream from a dropped one)
+def parse_stream(lines, on_done=None):
+    for line in lines:
+        data = parse_stream_line(line)
+        if data == "[DONE]":
+            if on_done is not None:
+                on_done()
+            return
+        if data:
+            yield data
+
+# Define a function to stream content deltas from an OpenAI-compatible chat endpoint.
+# `on_response` receives the live response so another thread can abort it; `on_stats` receives
+# chunks carrying usage, llama.cpp timings or the finish reason (usually the last ones); `on_done`
+# is called when the server ends the stream with [DONE].
+def stream_chat_completion(url, payload, headers=None, deadline=None, on_response=None, on_stats=None, on_done=None):
+    payload = {**payload, "stream": True}
+    endpoint, target = endpoint_pool.route(url, payload)
+    started, latency = time.perf_counter(), None
+    # The deadline covers connecting and retries only. Once tokens flow, the read timeout bounds the
+    # gap between chunks instead, so long generations are not cut off while the server is still busy.
+    send = lambda timeout: post(target, json=payload, headers=headers, timeout=(timeout[0], resilience.STREAM_IDLE_TIMEOUT), stream=True)
+    try:
+        with resilience.call(target, send, deadline=deadline or resilience.DEFAULT_DEADLINE) as response:
+            response.raise_for_status()
+            if on_response is not None:
+                on_response(response)
+            try:
+                for data in parse_stream(response.iter_lines(), on_done):
+                    chunk = json.loads(data)
+                    choice = (chunk.get("choices") or [{}])[0]
+                    if on_stats is not None and (chunk.get("usage") or chunk.get("timings") or choice.get("finish_reason")):
+                        on_stats(chunk)
+                    token = choice.get("delta", {}).get("content") or choice.get("text")
+                    if token:
+                        if latency is None:
+                            # Time to first token, the latency the endpoint pool ranks servers by
+                            latency = time.perf_counter() - started
+                        yield token
+            except requests.exceptions.ConnectionError as e:
+                # requests reports a read timeout mid-stream as a ConnectionError
+                if not (e.args and isinstance(e.args[0], ReadTimeoutError)):
+                    raise
+                resilience._count("timeouts")
+                raise resilience.StreamStalled(f"No data from {target} for {resilience.STREAM_IDLE_TIMEOUT:.0f}s") from e
+    finally:
+        endpoint_pool.release(endpoint, latency)
+
+# Define a function to abort a streaming response from another thread, so the server frees its slot
+def abort_response(response):
+    connection = getattr(response.raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        try:
+            # Wakes a reader blocked in recv(), which close() alone does not do
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+# A token stream shared by every caller of an identical in-flight request.
+# Late subscribers first receive everything published so far; the HTTP stream is
+# aborted once the last subscriber cancels.
+class SharedStream:
+    def __init__(self):
+        self.parts = []
+        self.done = False
+        self.stats = None  # Usage/timings chunk reported by the server, if any
+        self.finish_reason = None  # "stop", or "length" when the token limit cut the reply off
+        self.completed = False  # The server ended the stream with [DONE] (or it was replayed from the cache)
+        self.error = None  # Exception that broke the stream off, kept apart from the streamed text
+        self._cancel_event = threading.Event()
+        self._response = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    # Return a queue receiving the tokens of this stream; None marks the end
+    def subscribe(self):
+        tokens = queue.SimpleQueue()
+        with self._lock:
+            if self.parts:
+                tokens.put("".join(self.parts))
+            if self.done:
+                tokens.put(None)
+            else:
+                self._subscribers.append(tokens)
+        return tokens
+
+    # Stop delivering to a queue; cancels the request when nobody is left listening
+    def unsubscribe(self, tokens):
+        with self._lock:
+            if tokens in self._subscribers:
+                self._subscribers.remove(tokens)
+                tokens.put(None)
+            if self._subscribers or self.done:
+                return
+            self._cancel_event.set()
+            response = self._response
+        if response is not None:
+            abort_response(response)
+
+    # Same meaning as Future.cancelled(), so join_flight can skip abandoned streams
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def attach(self, response):
+        with self._lock:
+            self._response = response
+            cancelled = self._cancel_event.is_set()
+        if cancelled:
+            abort_response(response)
+
+    def set_completed(self):
+        self.completed = True
+
+    def set_stats(self, chunk):
+        reason = (chunk.get("choices") or [{}])[0].get("finish_reason")
+        if reason:
+            self.finish_reason = reason
+        if chunk.get("usage") or chunk.get("timings"):
+            self.stats = chunk
+
+    def publish(self, token):
+        with self._lock:
+            self.parts.append(token)
+            for tokens in self._subscribers:
+                tokens.put(token)
+
+    def close(self):
+        with self._lock:
+            self.done = True
+            self._response = None
+            for tokens in self._subscribers:
+                tokens.put(None)
+            self._subscribers.clear()
+
+# One caller's view of a shared stream
+class StreamSubscription:
+    def __init__(self, stream):
+        self.stream = stream
+        self.tokens = stream.subscribe()
+        self.token_count = 0
+        self.finished = False
+
+    # Take everything queued so far without blocking; returns (text, finished)
+    def drain(self):
+        chunk = []
+        while not self.finished:
+            try:
+                token = self.tokens.get_nowait()
+            except queue.Empty:
+                break
+            if token is None:
+                self.finished = True
+            else:
+                chunk.append(token)
+        self.token_count += len(chunk)
+        return "".join(chunk), self.finished
+
+    @property
+    def finish_reason(self):
+        return self.stream.finish_reason
+
+    @property
+    def completed(self):
+        return self.stream.completed
+
+    # Exception the stream failed with, or None; set before the stream finishes
+    @property
+    def error(self):
+        return self.stream.error
+
+    # Stop listening; the HTTP stream is aborted if no other caller shares it
+    def cancel(self):
+        self.stream.unsubscribe(self.tokens)
+
+# Define a function to read a token stream on a worker thread and return a StreamSubscription.
+# Identical streams already running are shared rather than requested again.
+def stream_in_background(url, payload, headers=None, deadline=None, use_cache=True):
+    key = response_cache.cache_key(payload)
+    flight_key = ("stream", url, key)
+    stream, leader = join_flight(flight_key, SharedStream)
+    subscription = StreamSubscription(stream)
+    if not leader:
+        return subscription
+
+    def read_stream():
+        try:
+            cached = cached_response(payload, key) if use_cache else None
+            if cached is not None:
+                response = json.loads(cached)
+                stream.finish_reason = (response.get("choices") or [{}])[0].get("finish_reason")
+                stream.completed = True
+                stream.publish(completion_text(response, ""))
+                return
+            for token in stream_chat_completion(url, payload, headers=headers, deadline=deadline, on_response=stream.attach, on_stats=stream.set_stats, on_done=stream.set_completed):
+                if stream.cancelled():
+                    break
+                stream.publish(token)
+            if use_cache and stream.parts and not stream.cancelled() and (stream.completed or stream.finish_reason):
+                # Stored in chat completion form so streamed and blocking requests share entries.
+                # Streams that ended without [DONE] or a finish reason may be incomplete and are not stored.
+                message = {"role": "assistant", "content": "".join(stream.parts)}
+                store_response(payload, key, json.dumps({"choices": [{"message": message, "finish_reason": stream.finish_reason}]}))
+        except Exception as e:
+            if stream.cancelled():
+                logging.info("Streaming request cancelled")
+            else:
+                logging.error(f"Streaming error: {e}")
+                stream.error = e
+        finally:
+            end_flight(flight_key, stream)
+            stream.close()
+
+    threading.Thread(target=read_stream, daemon=True).start()
+    return subscription
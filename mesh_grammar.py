@@ -0,0 +1,147 @@
+import logging
+import threading
+from collections import Counter
+
+# Limits of the constrained output: LLaMA-Mesh coordinates are integers in [0, COORDINATE_LEVELS)
+COORDINATE_LEVELS = 64
+MAX_VERTICES = 2000  # Largest face index the grammar allows
+MAX_FACE_SIZE = 4  # Triangles and quads
+
+# Define a function to write a GBNF character class or literal for one digit position
+def _digit_rule(low, high):
+    return f'"{low}"' if low == high else f"[{low}-{high}]"
+
+# Define a function to list GBNF sequences matching the integers between two equally long numbers
+def _same_length(low, high):
+    if len(low) == 1:
+        return [_digit_rule(low, high)]
+    if low[0] == high[0]:
+        return [f'"{low[0]}" {rest}' for rest in _same_length(low[1:], high[1:])]
+    tail = len(low) - 1
+    if low[1:] == "0" * tail and high[1:] == "9" * tail:
+        return [_digit_rule(low[0], high[0]) + " [0-9]" * tail]
+    sequences = [f'"{low[0]}" {rest}' for rest in _same_length(low[1:], "9" * tail)]
+    if int(high[0]) - int(low[0]) > 1:
+        sequences.append(_digit_rule(int(low[0]) + 1, int(high[0]) - 1) + " [0-9]" * tail)
+    sequences += [f'"{high[0]}" {rest}' for rest in _same_length("0" * tail, high[1:])]
+    return sequences
+
+# Define a function to write a GBNF alternation matching exactly the integers in [low, high]
+def integer_range(low, high):
+    sequences = []
+    for digits in range(len(str(low)), len(str(high)) + 1):
+        start = max(low, 10 ** (digits - 1) if digits > 1 else 0)
+        end = min(high, 10 ** digits - 1)
+        if start <= end:
+            sequences += _same_length(str(start), str(end))
+    return " | ".join(f"({sequence})" if " " in sequence else sequence for sequence in sequences)
+
+# Define a function to build the GBNF grammar of a bare OBJ mesh: vertex lines with integer coordinates
+# in [0, levels), then faces of 3..max_face_size indices in [1, max_vertices], and nothing else.
+# With resume the output may start anywhere in that sequence (continuing a mesh that was cut off).
+def obj_grammar(levels=COORDINATE_LEVELS, max_vertices=MAX_VERTICES, max_face_size=MAX_FACE_SIZE, resume=False):
+    optional_indices = ' (" " index)?' * (max_face_size - 3)
+    return "\n".join([
+        "root ::= vertex* face+" if resume else "root ::= vertex+ face+",
+        'vertex ::= "v " coord " " coord " " coord "\\n"',
+        f'face ::= "f " index " " index " " index{optional_indices} "\\n"',
+        f"coord ::= {integer_range(0, levels - 1)}",
+        f"index ::= {integer_range(1, max_vertices)}",
+    ]) + "\n"
+
+_llama_grammars = {}
+
+# Define a function to get the grammar compiled for llama-cpp-python (cached per settings)
+def llama_grammar(levels=COORDINATE_LEVELS, max_vertices=MAX_VERTICES, max_face_size=MAX_FACE_SIZE):
+    key = (levels, max_vertices, max_face_size)
+    if key not in _llama_grammars:
+        from llama_cpp import LlamaGrammar
+        _llama_grammars[key] = LlamaGrammar.from_string(obj_grammar(*key), verbose=False)
+    return _llama_grammars[key]
+
+# Define a function to list the problems of generated OBJ text as a Counter:
+# "chatter" (lines that are not v/f), "malformed_vertex", "malformed_face", "coordinate_out_of_range",
+# "index_out_of_range" and "no_faces". Chatter alone does not make a mesh unusable.
+# Coordinates are only checked against [0, levels) when levels is given.
+def validate_obj(text, levels=COORDINATE_LEVELS):
+    problems = Counter()
+    vertex_count = 0
+    face_indices = []
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields:
+            continue
+        if fields[0] == "v":
+            try:
+                coordinates = [float(value) for value in fields[1:4]]
+            except ValueError:
+                coordinates = []
+            if len(coordinates) != 3:
+                problems["malformed_vertex"] += 1
+                continue
+            vertex_count += 1
+            if levels and not all(0 <= value < levels and value == int(value) for value in coordinates):
+                problems["coordinate_out_of_range"] += 1
+        elif fields[0] == "f":
+            try:
+                indices = [int(value.split("/")[0]) for value in fields[1:]]
+            except ValueError:
+                indices = []
+            if len(indices) < 3:
+                problems["malformed_face"] += 1
+                continue
+            face_indices.append(indices)
+        else:
+            problems["chatter"] += 1
+    for indices in face_indices:
+        if not all(1 <= index <= vertex_count for index in indices):
+            problems["index_out_of_range"] += 1
+    if not face_indices:
+        problems["no_faces"] += 1
+    return problems
+
+# Define a function to tell whether validate_obj's problems leave a usable mesh
+def is_valid(problems):
+    return not any(count for name, count in problems.items() if name != "chatter")
+
+# Running validity statistics of generated meshes: how many were usable, why the others were not
+# and how many generated tokens were spent on meshes that had to be thrown away
+class ValidityReport:
+    def __init__(self):
+        self.generations = 0
+        self.valid = 0
+        self.tokens = 0
+        self.tokens_wasted = 0
+        self.problems = Counter()
+        self._lock = threading.Lock()
+
+    # Validate one finished generation of `tokens` tokens; returns its problems. Only grammar-constrained
+    # output is held to the grammar's coordinate range; other output (float coordinates, other grid
+    # sizes) is checked for structure only.
+    def record(self, text, tokens, constrained=False):
+        problems = validate_obj(text, COORDINATE_LEVELS if constrained else None)
+        valid = is_valid(problems)
+        with self._lock:
+            self.generations += 1
+            self.tokens += tokens
+            self.problems.update(problems)
+            if valid:
+                self.valid += 1
+            else:
+                self.tokens_wasted += tokens
+        logging.info(f"Mesh {'valid' if valid else 'invalid'}{' (grammar-constrained)' if constrained else ''}: {dict(problems) or 'no problems'}")
+        return problems
+
+    def stats(self):
+        with self._lock:
+            return {
+                "generations": self.generations,
+                "valid": self.valid,
+                "validity_rate": self.valid / self.generations if self.generations else 0.0,
+                "tokens": self.tokens,
+                "tokens_wasted": self.tokens_wasted,
+                "problems": dict(self.problems),
+            }
+
+# Report shared by every mesh generation of the add-on
+default_report = ValidityReport()
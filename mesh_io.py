@@ -0,0 +1,461 @@
+import re
+import logging
+from collections import Counter
+import numpy as np
+
+# Initial capacity of the streaming parser buffers (grown by doubling)
+INITIAL_CAPACITY = 1024
+
+# Grid sizes LLaMA-Mesh may quantize coordinates to, and the box decoded meshes are fitted into
+QUANTIZATION_LEVELS = (64, 128, 256)
+TARGET_BBOX_MIN = (-1.0, -1.0, -1.0)
+TARGET_BBOX_MAX = (1.0, 1.0, 1.0)
+
+# Mesh repair tolerances, relative to the bounding-box diagonal of the mesh: vertices closer than
+# WELD_DISTANCE are merged, faces with an area below DEGENERATE_AREA (times the diagonal squared) dropped
+WELD_DISTANCE = 1e-6
+DEGENERATE_AREA = 1e-12
+
+# Line prefixes of OBJ data the streaming parser treats as part of the mesh
+OBJ_DATA_PREFIXES = ("v ", "vt ", "vn ", "f ", "o ", "g ", "s ", "usemtl ", "mtllib ")
+
+# Define a function to grow a numpy buffer so it can hold at least `needed` rows
+def _grow(buffer, needed):
+    if needed <= len(buffer):
+        return buffer
+    grown = np.empty((max(needed, 2 * len(buffer)),) + buffer.shape[1:], dtype=buffer.dtype)
+    grown[:len(buffer)] = buffer
+    return grown
+
+# Lookup table: byte value -> is OBJ whitespace
+_WHITESPACE = np.zeros(256, dtype=bool)
+_WHITESPACE[list(b" \t\r\n")] = True
+# Lookup table: byte value -> indents a line
+_INDENT = np.zeros(256, dtype=bool)
+_INDENT[list(b" \t")] = True
+_LEADING_WHITESPACE = re.compile(r"^[ \t]+", re.MULTILINE)
+
+# Define a function to pull the records of the selected lines out of the text buffer.
+# The one-letter prefix is blanked, so every record starts with whitespace.
+def _select_records(body, line_lengths, selected):
+    records = body[np.repeat(selected, line_lengths)]
+    record_lengths = line_lengths[selected]
+    record_starts = np.zeros(len(record_lengths), dtype=np.int64)
+    np.cumsum(record_lengths[:-1], out=record_starts[1:])
+    records[record_starts] = ord(" ")
+    return records, record_starts
+
+# Define a function to count the whitespace-separated tokens of each record
+def _count_tokens(records, record_starts):
+    if len(record_starts) == 0:
+        return np.zeros(0, dtype=np.int32)
+    space = _WHITESPACE[records]
+    token_start = ~space
+    token_start[1:] &= space[:-1]
+    return np.add.reduceat(token_start, record_starts, dtype=np.int32)
+
+# Define a function to cut "/vt/vn" suffixes off face corners ("f a/b/c" -> "f a")
+def _strip_corner_suffixes(records, record_starts):
+    slash = records == ord("/")
+    if not slash.any():
+        return records, record_starts
+    event = slash | _WHITESPACE[records]
+    last_event = np.maximum.accumulate(np.where(event, np.arange(len(records)), 0))
+    keep = ~slash[last_event]
+    return records[keep], np.cumsum(keep)[record_starts] - 1
+
+# Define a function to parse OBJ text in bulk; raises ValueError on malformed numbers.
+# `vertex_offset` is the number of vertices parsed before this text, for negative indices.
+def _parse_records(text, vertex_offset=0):
+    buffer = np.frombuffer(b"\n" + text.encode("utf-8") + b"\n", dtype=np.uint8)
+    newlines = np.flatnonzero(buffer == ord("\n"))
+    starts = newlines[:-1] + 1
+    if _INDENT[buffer[starts]].any():
+        # Indented records (e.g. inside a code block): strip the indentation and parse again
+        return _parse_records(_LEADING_WHITESPACE.sub("", text), vertex_offset)
+    line_lengths = np.diff(newlines)
+    separated = _WHITESPACE[buffer[np.minimum(starts + 1, len(buffer) - 1)]]
+    is_vertex = (buffer[starts] == ord("v")) & separated
+    is_face = (buffer[starts] == ord("f")) & separated
+    body = buffer[1:]
+
+    # Vertices: keep the first three coordinates of every record with at least three
+    records, record_starts = _select_records(body, line_lengths, is_vertex)
+    counts = _count_tokens(records, record_starts)
+    values = np.array(records.tobytes().split(), dtype=np.float32)
+    if np.all(counts == 3):
+        vertices = values.reshape(-1, 3)
+    else:
+        first_token = np.cumsum(counts) - counts
+        vertices = values[first_token[counts >= 3, None] + np.arange(3)]
+        vertex_lines = np.flatnonzero(is_vertex)
+        is_vertex[vertex_lines[counts < 3]] = False
+
+    # Faces: flat corner indices plus the corner count per face (loop-start/loop-total layout)
+    records, record_starts = _select_records(body, line_lengths, is_face)
+    records, record_starts = _strip_corner_suffixes(records, record_starts)
+    face_sizes = _count_tokens(records, record_starts)
+    loops = np.array(records.tobytes().split(), dtype=np.int64)
+    vertices_before = (vertex_offset + np.cumsum(is_vertex))[is_face]
+    loops = np.where(loops < 0, loops + np.repeat(vertices_before, face_sizes), loops - 1)
+    polygon = face_sizes >= 3
+    if not np.all(polygon):
+        loops = loops[np.repeat(polygon, face_sizes)]
+        face_sizes = face_sizes[polygon]
+    return np.ascontiguousarray(vertices), loops.astype(np.int32), face_sizes
+
+# Define a function to parse OBJ text line by line, skipping anything malformed
+def _parse_lines(text, vertex_offset=0):
+    vertices, loops, face_sizes = [], [], []
+    for line in text.splitlines():
+        parts = line.split()
+        try:
+            if len(parts) >= 4 and parts[0] == "v":
+                vertices.append([float(value) for value in parts[1:4]])
+            elif len(parts) >= 4 and parts[0] == "f":
+                indices = [int(corner.split("/")[0]) for corner in parts[1:]]
+                vertex_count = vertex_offset + len(vertices)
+                loops.extend(index - 1 if index > 0 else vertex_count + index for index in indices)
+                face_sizes.append(len(indices))
+        except ValueError:
+            continue
+    return (np.array(vertices, dtype=np.float32).reshape(-1, 3),
+            np.array(loops, dtype=np.int32), np.array(face_sizes, dtype=np.int32))
+
+# Define a function to parse OBJ text into (vertices, loops, face_sizes) arrays.
+# Handles "v x y z", "f a b c", "f a/b/c", ngons and negative indices; loops are 0-based.
+def parse_obj(text, vertex_offset=0):
+    try:
+        return _parse_records(text, vertex_offset)
+    except ValueError:
+        # Chatter that happens to start with "v " or "f ": fall back to the tolerant parser
+        return _parse_lines(text, vertex_offset)
+
+# Incremental OBJ parser fed with streamed text; keeps growing vertex/face buffers.
+# Faces are stored flat: `loops` holds every corner index (0-based), `face_sizes` the corner count per face.
+class StreamingObjParser:
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self._vertices = np.empty((capacity, 3), dtype=np.float32)
+        self._loops = np.empty(capacity * 3, dtype=np.int32)
+        self._face_sizes = np.empty(capacity, dtype=np.int32)
+        self.vertex_count = 0
+        self.loop_count = 0
+        self.face_count = 0
+        self.ended = False  # A line that is not OBJ data (e.g. a closing ``` fence) followed the faces
+        self._pending = ""
+        self._faces_before_resume = 0
+
+    @property
+    def vertices(self):
+        return self._vertices[:self.vertex_count]
+
+    @property
+    def loops(self):
+        return self._loops[:self.loop_count]
+
+    @property
+    def face_sizes(self):
+        return self._face_sizes[:self.face_count]
+
+    # Feed the next chunk of streamed text; complete lines are parsed in one batch
+    def feed(self, chunk):
+        self._pending += chunk
+        end = self._pending.rfind("\n") + 1
+        if end:
+            complete, self._pending = self._pending[:end], self._pending[end:]
+            self._append(*parse_obj(complete, self.vertex_count))
+            if self.face_count > self._faces_before_resume and not self.ended:
+                self.ended = _ends_mesh(complete)
+
+    # Parse whatever is left once the stream has ended
+    def close(self):
+        if self._pending:
+            self._append(*parse_obj(self._pending, self.vertex_count))
+            self._pending = ""
+
+    # Continue with the text of another reply after this one was cut off: the incomplete last line
+    # is dropped, and only a line following new faces counts as the end of the mesh
+    def resume(self):
+        self._pending = ""
+        self._faces_before_resume = self.face_count
+
+    def _append(self, vertices, loops, face_sizes):
+        self._vertices = _grow(self._vertices, self.vertex_count + len(vertices))
+        self._loops = _grow(self._loops, self.loop_count + len(loops))
+        self._face_sizes = _grow(self._face_sizes, self.face_count + len(face_sizes))
+        self._vertices[self.vertex_count:self.vertex_count + len(vertices)] = vertices
+        self._loops[self.loop_count:self.loop_count + len(loops)] = loops
+        self._face_sizes[self.face_count:self.face_count + len(face_sizes)] = face_sizes
+        self.vertex_count += len(vertices)
+        self.loop_count += len(loops)
+        self.face_count += len(face_sizes)
+
+# Define a function to tell whether text has a line after its last OBJ data line that is not OBJ
+# (comments and blank lines aside), i.e. the model moved on from the mesh
+def _ends_mesh(text):
+    lines = text.splitlines()
+    last = max((index for index, line in enumerate(lines) if line.lstrip().startswith(OBJ_DATA_PREFIXES)), default=-1)
+    return any(line.strip() and not line.lstrip().startswith("#") for line in lines[last + 1:])
+
+# Define a function to find, for every corner, the next corner around its face (the last one wraps to the first)
+def _next_corners(face_sizes):
+    starts = np.cumsum(face_sizes) - face_sizes
+    following = np.arange(1, int(face_sizes.sum()) + 1)
+    following[starts + face_sizes - 1] = starts
+    return following
+
+# Define a function to tell whether faces form a closed surface: every vertex is used and every
+# edge is shared by exactly two faces
+def is_closed_manifold(vertex_count, loops, face_sizes):
+    if len(face_sizes) < 4 or len(loops) == 0 or loops.min() < 0 or loops.max() != vertex_count - 1:
+        return False
+    first, second = loops.astype(np.int64), loops[_next_corners(face_sizes)].astype(np.int64)
+    edges = np.minimum(first, second) * vertex_count + np.maximum(first, second)
+    _, uses = np.unique(edges, return_counts=True)
+    return bool((uses == 2).all()) and np.unique(loops).size == vertex_count
+
+# Define a function to drop faces that reference vertices which do not exist (yet)
+def valid_faces(vertex_count, loops, face_sizes):
+    if len(face_sizes) == 0:
+        return loops, face_sizes
+    face_index = np.repeat(np.arange(len(face_sizes)), face_sizes)
+    bad_loops = (loops < 0) | (loops >= vertex_count)
+    bad_faces = np.zeros(len(face_sizes), dtype=bool)
+    bad_faces[face_index[bad_loops]] = True
+    return loops[~bad_faces[face_index]], face_sizes[~bad_faces]
+
+# Define a function to keep only the selected faces
+def _select_faces(loops, face_sizes, keep):
+    return loops[np.repeat(keep, face_sizes)], face_sizes[keep]
+
+# Define a function to merge vertices that fall into the same cell of a grid with `distance` spacing.
+# Kept vertices stay in first-seen order.
+def weld_vertices(vertices, loops, distance):
+    if len(vertices) == 0 or not distance:
+        return vertices, loops
+    cells = np.floor(vertices / distance + 0.5).astype(np.int64)
+    cells -= cells.min(axis=0)
+    sizes = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * sizes[1] + cells[:, 1]) * sizes[2] + cells[:, 2]
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    if len(first) == len(vertices):
+        return vertices, loops
+    order = np.argsort(first)
+    rank = np.empty(len(order), dtype=np.int32)
+    rank[order] = np.arange(len(order), dtype=np.int32)
+    return vertices[first[order]], rank[inverse.ravel()][loops]
+
+# Define a function to flag faces that use a vertex more than once
+def repeated_index_faces(loops, face_sizes):
+    ends = np.cumsum(face_sizes)
+    face_index = np.repeat(np.arange(len(face_sizes)), face_sizes)
+    remaining = np.repeat(ends - 1, face_sizes) - np.arange(len(loops))  # Corners after each one in its face
+    repeated = np.zeros(len(face_sizes), dtype=bool)
+    for offset in range(1, int(face_sizes.max(initial=0))):
+        corners = np.flatnonzero((remaining >= offset) & (loops == np.roll(loops, -offset)))
+        repeated[face_index[corners]] = True
+    return repeated
+
+# Define a function to flag faces that use the same vertices as an earlier face, in any order.
+# Faces are compared per size by their sorted vertex indices.
+def duplicate_faces(loops, face_sizes):
+    duplicate = np.zeros(len(face_sizes), dtype=bool)
+    starts = np.cumsum(face_sizes) - face_sizes
+    for size in np.unique(face_sizes):
+        faces = np.flatnonzero(face_sizes == size)
+        keys = np.sort(loops[starts[faces, None] + np.arange(size)], axis=1)
+        _, first = np.unique(keys, axis=0, return_index=True)
+        duplicate[faces] = True
+        duplicate[faces[first]] = False
+    return duplicate
+
+# Define a function to compute face areas from Newell's normal (works for non-planar ngons too)
+def face_areas(vertices, loops, face_sizes):
+    coordinates = vertices.T.astype(np.float64)
+    following = _next_corners(face_sizes)
+    face_index = np.repeat(np.arange(len(face_sizes)), face_sizes)
+    corners = [axis[loops] for axis in coordinates]
+    squared = np.zeros(len(face_sizes))
+    for a, b in ((1, 2), (2, 0), (0, 1)):
+        cross = corners[a] * corners[b][following] - corners[b] * corners[a][following]
+        component = np.bincount(face_index, cross, len(face_sizes))
+        squared += component * component
+    return 0.5 * np.sqrt(squared)
+
+# Define a function to make the winding of faces consistent. Two faces sharing a manifold edge must
+# traverse it in opposite directions. A vectorized union-find with parity groups faces joined by such
+# edges and records for each face whether it is flipped relative to its group's root; each group then
+# flips its smaller side. Returns the loops, the number of faces flipped, and the counts of
+# non-manifold edges (used by more than two faces) and edges left inconsistent (non-orientable surfaces).
+def orient_faces(vertex_count, loops, face_sizes):
+    face_index = np.repeat(np.arange(len(face_sizes)), face_sizes)
+    first = loops.astype(np.int64)
+    second = first[_next_corners(face_sizes)]
+    keys = np.minimum(first, second) * vertex_count + np.maximum(first, second)
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    run_starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    run_lengths = np.diff(np.r_[run_starts, len(keys)])
+    pairs = run_starts[run_lengths == 2]
+    corner_a, corner_b = order[pairs], order[pairs + 1]
+    face_a, face_b = face_index[corner_a], face_index[corner_b]
+    # Traversing the shared edge in the same direction means exactly one of the two faces is flipped
+    differ = (first[corner_a] < second[corner_a]) == (first[corner_b] < second[corner_b])
+    non_manifold = int(np.count_nonzero(run_lengths > 2))
+    if not differ.any():
+        return loops, 0, non_manifold, 0
+
+    parent = np.arange(len(face_sizes))
+    parity = np.zeros(len(face_sizes), dtype=bool)  # Flipped relative to the parent
+    hook = np.empty(len(face_sizes), dtype=np.int64)
+    active_a, active_b, active_differ = face_a, face_b, differ
+    while True:
+        # Pointer jumping until every face points at its root; only faces not there yet are updated
+        deep = np.flatnonzero(parent[parent] != parent)
+        while len(deep):
+            above = parent[deep]
+            parity[deep] ^= parity[above]
+            grandparent = parent[deep] = parent[above]
+            deep = deep[parent[grandparent] != grandparent]
+        root_a, root_b = parent[active_a], parent[active_b]
+        joining = root_a != root_b
+        if not joining.any():
+            break
+        # Edges inside one group stay consistent from here on; only joining edges are carried forward
+        active_a, active_b, active_differ = active_a[joining], active_b[joining], active_differ[joining]
+        root_a, root_b = root_a[joining], root_b[joining]
+        low, high = np.minimum(root_a, root_b), np.maximum(root_a, root_b)
+        relation = parity[active_a] ^ parity[active_b] ^ active_differ
+        # Hook every higher root to the lowest root it shares an edge with (one such edge per root
+        # decides both the new parent and the parity); parents only ever decrease, so no cycles form
+        lowest = parent.copy()
+        np.minimum.at(lowest, high, low)
+        candidates = np.flatnonzero(low == lowest[high])
+        hook[high[candidates]] = candidates
+        chosen = hook[np.flatnonzero(lowest != parent)]
+        parent[high[chosen]] = low[chosen]
+        parity[high[chosen]] = relation[chosen]
+
+    inconsistent = int(np.count_nonzero((parity[face_a] ^ parity[face_b]) != differ))
+    flipped_in_group = np.bincount(parent, weights=parity, minlength=len(face_sizes))
+    group_sizes = np.bincount(parent, minlength=len(face_sizes))
+    flip = parity ^ (2 * flipped_in_group > group_sizes)[parent]
+    corners = np.flatnonzero(flip[face_index])
+    if len(corners):
+        faces = face_index[corners]
+        mirrored = 2 * (np.cumsum(face_sizes) - face_sizes)[faces] + face_sizes[faces] - 1 - corners
+        loops = loops.copy()
+        loops[corners] = loops[mirrored]
+    return loops, int(np.count_nonzero(flip)), non_manifold, inconsistent
+
+# Define a function to validate and repair a mesh before it is built, with bulk numpy operations only:
+# faces with out-of-range indices are dropped (or the indices clamped), coincident vertices welded,
+# faces using a vertex twice, duplicating an earlier face or without area removed and the winding made consistent.
+# Returns the repaired (vertices, loops, face_sizes) and a Counter of what was fixed or found.
+def repair_mesh(vertices, loops, face_sizes, clamp_indices=False, weld_distance=WELD_DISTANCE, degenerate_area=DEGENERATE_AREA):
+    fixes = Counter()
+    if len(face_sizes) == 0 or len(vertices) == 0:
+        fixes["dropped_faces"] = len(face_sizes)
+        return vertices, loops[:0], face_sizes[:0], +fixes
+    out_of_range = (loops < 0) | (loops >= len(vertices))
+    if out_of_range.any():
+        if clamp_indices:
+            loops = np.clip(loops, 0, len(vertices) - 1)
+            fixes["clamped_indices"] = int(np.count_nonzero(out_of_range))
+        else:
+            bad = np.logical_or.reduceat(out_of_range, np.cumsum(face_sizes) - face_sizes)
+            loops, face_sizes = _select_faces(loops, face_sizes, ~bad)
+            fixes["out_of_range_faces"] = int(np.count_nonzero(bad))
+
+    diagonal = float(np.linalg.norm(vertices.max(axis=0) - vertices.min(axis=0))) or 1.0
+    welded, loops = weld_vertices(vertices, loops, weld_distance * diagonal)
+    fixes["welded_vertices"] = len(vertices) - len(welded)
+    vertices = welded
+
+    if len(face_sizes):
+        repeated = repeated_index_faces(loops, face_sizes)
+        loops, face_sizes = _select_faces(loops, face_sizes, ~repeated)
+        fixes["repeated_index_faces"] = int(np.count_nonzero(repeated))
+    if len(face_sizes):
+        duplicate = duplicate_faces(loops, face_sizes)
+        loops, face_sizes = _select_faces(loops, face_sizes, ~duplicate)
+        fixes["duplicate_faces"] = int(np.count_nonzero(duplicate))
+    if len(face_sizes):
+        degenerate = face_areas(vertices, loops, face_sizes) <= degenerate_area * diagonal ** 2
+        loops, face_sizes = _select_faces(loops, face_sizes, ~degenerate)
+        fixes["zero_area_faces"] = int(np.count_nonzero(degenerate))
+    if len(face_sizes):
+        loops, flipped, non_manifold, inconsistent = orient_faces(len(vertices), loops, face_sizes)
+        fixes["flipped_faces"] = flipped
+        fixes["non_manifold_edges"] = non_manifold
+        fixes["non_orientable_edges"] = inconsistent
+    return vertices, loops.astype(np.int32, copy=False), face_sizes, +fixes
+
+# Define a function to detect LLaMA-Mesh integer grid output; returns the grid size or None.
+# The grid is spanned by the model, so the largest coordinate must reach at least half of it.
+def detect_quantization(vertices):
+    if len(vertices) == 0 or vertices.min() < 0 or not np.array_equal(vertices, np.rint(vertices)):
+        return None
+    highest = vertices.max()
+    for levels in QUANTIZATION_LEVELS:
+        if levels // 2 <= highest < levels:
+            return levels
+    return None
+
+# Define a function to decode quantized vertices: vertices sharing a grid cell are merged, then
+# the mesh is scaled uniformly (one cell = target size / (levels - 1)) and centered in the target box
+def dequantize(vertices, loops, levels, bbox_min=TARGET_BBOX_MIN, bbox_max=TARGET_BBOX_MAX):
+    cells = vertices.astype(np.int64)
+    keys = (cells[:, 0] * levels + cells[:, 1]) * levels + cells[:, 2]
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    cells = cells[first]
+    bbox_min = np.asarray(bbox_min, dtype=np.float32)
+    bbox_max = np.asarray(bbox_max, dtype=np.float32)
+    scale = np.float32((bbox_max - bbox_min).min() / (levels - 1))
+    offset = (bbox_min + bbox_max) / 2 - (cells.min(axis=0) + cells.max(axis=0)) * scale / 2
+    decoded = np.empty((len(cells), 3), dtype=np.float32)
+    np.multiply(cells, scale, out=decoded, casting="unsafe")
+    decoded += offset
+    # Corners pointing at vertices that do not exist stay invalid (-1) for valid_faces to drop
+    remap = np.append(inverse.astype(np.int32), np.int32(-1))
+    in_range = (loops >= 0) & (loops < len(vertices))
+    return decoded, remap[np.where(in_range, loops, len(vertices))]
+
+# Define a function to decode the vertices if they are on a quantized grid, leaving other meshes untouched
+def decode_quantized(vertices, loops):
+    levels = detect_quantization(vertices)
+    if levels is None:
+        return vertices, loops
+    decoded, loops = dequantize(vertices, loops, levels)
+    logging.debug(f"Dequantized {len(vertices)} vertices on a {levels}-level grid into {len(decoded)}")
+    return decoded, loops
+
+# Define a function to replace the geometry of an existing mesh datablock with bulk foreach_set calls
+def update_mesh(mesh, vertices, loops, face_sizes):
+    loops, face_sizes = valid_faces(len(vertices), loops, face_sizes)
+    loop_starts = np.zeros(len(face_sizes), dtype=np.int32)
+    np.cumsum(face_sizes[:-1], out=loop_starts[1:])
+    mesh.clear_geometry()
+    mesh.vertices.add(len(vertices))
+    mesh.loops.add(len(loops))
+    mesh.polygons.add(len(face_sizes))
+    mesh.vertices.foreach_set("co", np.ascontiguousarray(vertices, dtype=np.float32).ravel())
+    mesh.loops.foreach_set("vertex_index", np.ascontiguousarray(loops, dtype=np.int32))
+    mesh.polygons.foreach_set("loop_start", loop_starts)
+    # Blender 4.0+ derives loop_total from loop_start and makes it read-only
+    if not mesh.polygons.bl_rna.properties["loop_total"].is_readonly:
+        mesh.polygons.foreach_set("loop_total", np.ascontiguousarray(face_sizes, dtype=np.int32))
+    mesh.update(calc_edges=True)
+    logging.debug(f"Mesh {mesh.name} updated: {len(vertices)} vertices, {len(face_sizes)} faces")
+
+# Define a function to create a new mesh datablock from OBJ text without touching the file system
+def mesh_from_obj(name, text):
+    import bpy  # Imported here so the parsers stay usable outside Blender
+    mesh = bpy.data.meshes.new(name)
+    vertices, loops, face_sizes = parse_obj(text)
+    vertices, loops = decode_quantized(vertices, loops)
+    vertices, loops, face_sizes, fixes = repair_mesh(vertices, loops, face_sizes)
+    if fixes:
+        logging.info(f"Repaired mesh {name}: {dict(fixes)}")
+    update_mesh(mesh, vertices, loops, face_sizes)
+    return mesh
@@ -0,0 +1,254 @@
+import time
+import logging
+import threading
+import numpy as np
+from . import lm_client, mesh_grammar, mesh_io
+
+# Continuation requests sent at most per mesh when the token limit cuts the reply off
+MAX_CONTINUATIONS = 2
+CONTINUE_PROMPT = "The mesh was cut off. Continue the OBJ exactly from the next line. Do not repeat earlier lines or add any other text."
+
+# Candidates raced per mesh by MeshRace, and the temperature range they are spread over
+RACE_CANDIDATES = 3
+TEMPERATURE_SPREAD = 0.3
+
+# Define a function to build the request resuming a cut-off mesh: the reply so far (complete lines
+# only) becomes an assistant turn followed by an instruction to go on from the next line
+def continuation_payload(payload, text):
+    messages = payload["messages"] + [
+        {"role": "assistant", "content": text},
+        {"role": "user", "content": CONTINUE_PROMPT},
+    ]
+    continuation = {**payload, "messages": messages}
+    if "grammar" in payload:
+        continuation["grammar"] = mesh_grammar.obj_grammar(resume=True)
+    return continuation
+
+# One mesh generation streamed into a StreamingObjParser. The request is cancelled as soon as the
+# mesh is structurally complete (the model moved on from the OBJ data, or the faces close the
+# surface), and a reply cut off by the token limit is resumed from its last complete line.
+class MeshStream:
+    def __init__(self, url, payload, headers=None, max_continuations=MAX_CONTINUATIONS, use_cache=True):
+        self.url = url
+        self.payload = payload
+        self.headers = headers
+        self.max_continuations = max_continuations
+        self.use_cache = use_cache
+        self.parser = mesh_io.StreamingObjParser()
+        self.continuations = 0
+        self.early_stopped = False
+        self.truncated = False  # Still cut off after the last continuation
+        self.finished = False
+        self.tokens = 0  # Streamed tokens of finished requests
+        self._chunks = []
+        self._checked_faces = 0
+        self._valid = None
+        self.started = time.perf_counter()
+        self.elapsed = None  # Seconds from the first request until the generation finished
+        self.subscription = lm_client.stream_in_background(url, payload, headers=headers, use_cache=use_cache)
+
+    # Text received so far; only complete lines once a request has been cut off or cancelled
+    @property
+    def text(self):
+        return "".join(self._chunks)
+
+    # Define a function to tell whether the mesh parsed so far is complete; the closed-surface
+    # test only runs when new faces arrived
+    def complete(self):
+        if self.parser.ended:
+            return True
+        if self.parser.face_count == self._checked_faces:
+            return False
+        self._checked_faces = self.parser.face_count
+        return mesh_io.is_closed_manifold(self.parser.vertex_count, self.parser.loops, self.parser.face_sizes)
+
+    # Define a function to tell whether the current request stopped at the token limit
+    def cut_off(self):
+        reason = self.subscription.finish_reason
+        if reason is not None:
+            return reason == "length"
+        # Servers that report no finish reason: a stream that ended without [DONE] was cut off
+        return not self.subscription.completed
+
+    # Take the newly streamed text into the parser; returns True once the generation is finished
+    def poll(self):
+        if self.finished:
+            return True
+        chunk, done = self.subscription.drain()
+        self._chunks.append(chunk)
+        self.parser.feed(chunk)
+        complete = self.complete()
+        if complete and not done:
+            self.subscription.cancel()
+            self.early_stopped = True
+            logging.info(f"Mesh complete after {self.parser.face_count} faces; stopped generating")
+        if not (done or self.early_stopped):
+            return False
+        self.tokens += self.subscription.token_count
+        failed = self.subscription.error is not None
+        if self.early_stopped:
+            self._drop_partial_line()
+        elif failed or (not complete and self.cut_off()):
+            # A failed stream may also have broken off in the middle of a line
+            self._drop_partial_line()
+            if complete:
+                self._finish()
+                return True
+            if self.continuations < self.max_continuations:
+                self._continue()
+                return False
+            self.truncated = True
+            logging.warning(f"Mesh still cut off after {self.continuations} continuations")
+        else:
+            self.parser.close()
+        self._finish()
+        return True
+
+    def _finish(self):
+        self.finished = True
+        self.elapsed = time.perf_counter() - self.started
+
+    # Define a function to tell whether the finished generation is a usable mesh (validated once).
+    # Coordinates are range-checked against the grammar's grid for constrained requests, or against
+    # the grid the vertices were detected on; anything else is checked for structure only.
+    def valid(self):
+        if not self.finished:
+            return False
+        if self._valid is None:
+            if "grammar" in self.payload:
+                levels = mesh_grammar.COORDINATE_LEVELS
+            else:
+                levels = mesh_io.detect_quantization(self.parser.vertices)
+            self._valid = not self.truncated and mesh_grammar.is_valid(mesh_grammar.validate_obj(self.text, levels))
+        return self._valid
+
+    def _drop_partial_line(self):
+        text = self.text
+        self._chunks = [text[:text.rfind("\n") + 1]]
+        self.parser.resume()
+
+    def _continue(self):
+        self.continuations += 1
+        logging.info(f"Mesh cut off at {self.parser.vertex_count} vertices, {self.parser.face_count} faces; requesting continuation {self.continuations}")
+        payload = continuation_payload(self.payload, self.text)
+        self.subscription = lm_client.stream_in_background(self.url, payload, headers=self.headers, use_cache=self.use_cache)
+
+    # Stop generating (e.g. the operator was cancelled)
+    def cancel(self):
+        if not self.finished:
+            self.subscription.cancel()
+            self.tokens += self.subscription.token_count
+            self.truncated = True
+            self._finish()
+
+# Define a function to derive the payloads of raced candidates: each gets its own seed, and their
+# temperatures are spread evenly over `spread` around the payload's temperature. Seeds are fixed
+# per candidate position, so repeated prompts are still served from the response cache.
+def candidate_payloads(payload, count, spread=TEMPERATURE_SPREAD):
+    temperature = payload.get("temperature", 0.7)
+    payloads = []
+    for index in range(count):
+        offset = spread * (index / (count - 1) - 0.5) if count > 1 else 0.0
+        payloads.append({**payload, "seed": index, "temperature": round(max(temperature + offset, 0.0), 3)})
+    return payloads
+
+# Races several sampled candidates of one mesh prompt at the same time. Every candidate streams
+# through its own MeshStream; the first one that finishes as a valid mesh wins and the others are
+# cancelled right away. Spends server capacity on the losers in exchange for a lower time to a
+# usable mesh. Offers the same poll/parser/text interface as MeshStream.
+class MeshRace:
+    def __init__(self, url, payload, headers=None, candidates=RACE_CANDIDATES, max_continuations=MAX_CONTINUATIONS, use_cache=True):
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.candidates = [
+            MeshStream(url, candidate, headers, max_continuations, use_cache)
+            for candidate in candidate_payloads(payload, candidates)
+        ]
+        self.winner = None
+        self.finished = False
+
+    # The candidate shown while racing: the winner, else the one with the most faces so far
+    @property
+    def leader(self):
+        if self.winner is not None:
+            return self.winner
+        return max(self.candidates, key=lambda candidate: (candidate.valid(), candidate.parser.face_count, candidate.parser.vertex_count))
+
+    @property
+    def parser(self):
+        return self.leader.parser
+
+    @property
+    def text(self):
+        return self.leader.text
+
+    # Streamed tokens of all candidates, i.e. the server work the race cost
+    @property
+    def tokens(self):
+        return sum(candidate.tokens for candidate in self.candidates)
+
+    def valid(self):
+        return self.winner is not None
+
+    # Poll every running candidate; returns True once a valid mesh won or all candidates finished
+    def poll(self):
+        if self.finished:
+            return True
+        running = False
+        for candidate in self.candidates:
+            if candidate.finished:
+                continue
+            if not candidate.poll():
+                running = True
+            elif candidate.valid():
+                self.winner = candidate
+                break
+        if self.winner is None and running:
+            return False
+        self.cancel()
+        if self.winner is not None:
+            logging.info(f"Mesh candidate {self.candidates.index(self.winner) + 1}/{len(self.candidates)} won after {self.elapsed:.2f}s (temperature {self.winner.payload['temperature']})")
+        else:
+            logging.warning(f"None of {len(self.candidates)} mesh candidates was valid")
+        return True
+
+    # Stop every candidate still generating
+    def cancel(self):
+        for candidate in self.candidates:
+            candidate.cancel()
+        if not self.finished:
+            self.finished = True
+            self.elapsed = time.perf_counter() - self.started
+
+# Running time-to-mesh statistics per generation mode ("single" requests or "race"s), so the
+# latency distributions of both can be compared
+class LatencyReport:
+    def __init__(self):
+        self.latencies = {}
+        self.valid = {}
+        self._lock = threading.Lock()
+
+    def record(self, mode, seconds, valid):
+        with self._lock:
+            self.latencies.setdefault(mode, []).append(seconds)
+            self.valid[mode] = self.valid.get(mode, 0) + bool(valid)
+
+    def stats(self):
+        with self._lock:
+            latencies = {mode: np.array(values) for mode, values in self.latencies.items()}
+            valid = dict(self.valid)
+        return {
+            mode: {
+                "generations": len(values),
+                "validity_rate": valid[mode] / len(values),
+                "mean": float(values.mean()),
+                "p50": float(np.percentile(values, 50)),
+                "p90": float(np.percentile(values, 90)),
+                "p99": float(np.percentile(values, 99)),
+                "max": float(values.max()),
+            }
+            for mode, values in latencies.items()
+        }
+
+# Report shared by every mesh generation of the add-on
+default_latencies = LatencyReport()
@@ -0,0 +1,175 @@
+import re
+import logging
+import itertools
+from functools import lru_cache
+
+# Prompt budget: the model's context window and the per-message overhead of the chat template
+CONTEXT_TOKENS = 4096
+MESSAGE_OVERHEAD = 4  # Role and separator tokens added around every message
+# Prompt-cache hints for llama.cpp-style servers: "cache_prompt" and, when SERVER_SLOTS > 0, an "id_slot"
+# pinning each session to one of the server's slots (--parallel). Other servers ignore them.
+PREFIX_CACHE_HINTS = True
+SERVER_SLOTS = 0
+COMPACT_TARGET = 0.5  # Fraction of the budget a compacted session shrinks to, leaving room to grow append-only
+# Only the newest FULL_REPLIES mesh/code replies are sent in full; older ones become short stubs
+FULL_REPLIES = 1
+
+# Rough BPE approximation: digits count one token each, words and punctuation one token
+_TOKEN_PATTERN = re.compile(r"\d|[^\W\d]+|[^\w\s]")
+_OBJ_LINE = re.compile(r"^(v|vt|vn|f) ", re.MULTILINE)
+_CODE_LINE = re.compile(r"^(import |from \S+ import |def |class )|bpy\.", re.MULTILINE)
+
+# Define a function to estimate the number of tokens in a text (memoized, replies repeat every turn)
+@lru_cache(maxsize=1024)
+def count_tokens(text):
+    return len(_TOKEN_PATTERN.findall(text))
+
+# Define a function to get the token count of a history message, cached on the message itself
+def message_tokens(message):
+    if "tokens" not in message:
+        message["tokens"] = count_tokens(to_message(message)["content"]) + MESSAGE_OVERHEAD
+    return message["tokens"]
+
+# Define a function to classify a reply as "OBJ mesh", "Python code" or None (plain text)
+@lru_cache(maxsize=1024)
+def reply_kind(content):
+    if len(_OBJ_LINE.findall(content, 0, 4096)) >= 3:
+        return "OBJ mesh"
+    if "```" in content or _CODE_LINE.search(content):
+        return "Python code"
+    return None
+
+# Define a function to format an assistant reply for the prompt: code is fenced, old code is stubbed
+@lru_cache(maxsize=1024)
+def assistant_content(content, stub=False):
+    kind = reply_kind(content)
+    if kind is None:
+        return content
+    if stub:
+        return f"[{kind} from an earlier reply omitted ({content.count(chr(10)) + 1} lines)]"
+    return content if "```" in content else "```\n" + content + "\n```"
+
+# Define a function to turn one history entry ({"type": ..., "content": ...}) into a chat message
+def to_message(message, stub=False):
+    if message["type"] == "assistant":
+        return {"role": "assistant", "content": assistant_content(message["content"], stub)}
+    return {"role": message["type"].lower(), "content": message["content"]}
+
+# Define a function to build the chat messages for a prompt: the system prompt, then the newest history
+# entries that fit into `budget` tokens after reserving `reserve` tokens for the reply, then the prompt
+def build_messages(history, system_prompt, prompt, budget=CONTEXT_TOKENS, reserve=0):
+    available = budget - reserve - count_tokens(system_prompt) - count_tokens(prompt) - 2 * MESSAGE_OVERHEAD
+    selected = []
+    full_replies = 0
+    for message in reversed(history):
+        stub = False
+        if message["type"] == "assistant" and reply_kind(message["content"]):
+            stub = full_replies >= FULL_REPLIES
+            full_replies += 1
+        if not stub and message_tokens(message) > available and reply_kind(message["content"]):
+            # A reply too large for the budget is still worth referencing
+            stub = True
+        converted = to_message(message, stub)
+        tokens = count_tokens(converted["content"]) + MESSAGE_OVERHEAD if stub else message_tokens(message)
+        if tokens > available:
+            break
+        available -= tokens
+        selected.append(converted)
+    # Start the window on a user turn rather than on a dangling reply
+    while selected and selected[-1]["role"] == "assistant":
+        selected.pop()
+    return [{"role": "system", "content": system_prompt}, *reversed(selected), {"role": "user", "content": prompt}]
+
+_session_ids = itertools.count()
+_conversation_ids = itertools.count(1)
+
+# Define a function to get a new conversation id, sent as the OpenAI "user" field so that
+# endpoint_pool keeps every turn of the conversation on one server
+def new_conversation_id():
+    return f"conversation-{next(_conversation_ids)}"
+
+# A multi-turn chat whose prompt only ever grows at the end. The system prompt and earlier turns stay
+# byte-identical, so servers with prefix caching (llama.cpp, LM Studio) only prefill the new turn.
+# When the budget is exhausted the history is compacted once with build_messages and grows from there.
+class ChatSession:
+    def __init__(self, system_prompt, budget=CONTEXT_TOKENS):
+        self.system_prompt = system_prompt
+        self.budget = budget
+        self.history = []
+        self.messages = []
+        self.tokens = count_tokens(system_prompt) + MESSAGE_OVERHEAD
+        self.slot = next(_session_ids) % SERVER_SLOTS if SERVER_SLOTS else None
+        self.conversation_id = new_conversation_id()
+        self.turns = 0
+        self.compactions = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.prefill_ms = 0.0
+        self.prefill_ms_saved = 0.0
+
+    # Return the messages for the next prompt, compacting first if they would not fit
+    def build(self, prompt, reserve=0):
+        needed = count_tokens(prompt) + MESSAGE_OVERHEAD + reserve
+        if self.tokens + needed > self.budget:
+            self.compact(needed)
+        return [{"role": "system", "content": self.system_prompt}, *self.messages, {"role": "user", "content": prompt}]
+
+    # Rebuild the prefix from the history within COMPACT_TARGET of the budget; the next request prefills it once
+    def compact(self, reserve):
+        self.messages = build_messages(self.history, self.system_prompt, "", int(self.budget * COMPACT_TARGET), reserve)[1:-1]
+        self.tokens = sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD for message in self.messages)
+        self.tokens += count_tokens(self.system_prompt) + MESSAGE_OVERHEAD
+        self.compactions += 1
+        logging.info(f"Chat session compacted to {len(self.messages)} messages, ~{self.tokens} tokens")
+
+    # Return the request payload for a prompt, with prompt-cache hints
+    def payload(self, prompt, model_params):
+        payload = {"messages": self.build(prompt, model_params.get("max_tokens", 0)), **model_params, "user": self.conversation_id}
+        if PREFIX_CACHE_HINTS:
+            payload["cache_prompt"] = True
+        if self.slot is not None:
+            payload["id_slot"] = self.slot
+        return payload
+
+    # Append a finished exchange; `response` (JSON or the final stream chunk) is used to measure prefill reuse
+    def record(self, prompt, reply, response=None):
+        for entry in ({"type": "user", "content": prompt}, {"type": "assistant", "content": reply}):
+            self.history.append(entry)
+            self.messages.append(to_message(entry))
+            self.tokens += message_tokens(entry)
+        self.turns += 1
+        if response:
+            self.measure(response)
+
+    # Accumulate how many prompt tokens the server reused and the prefill time that saved.
+    # Reads OpenAI usage.prompt_tokens_details.cached_tokens or llama.cpp timings (prompt_n, prompt_ms, cache_n).
+    def measure(self, response):
+        usage = response.get("usage") or {}
+        timings = response.get("timings") or {}
+        prompt_n = timings.get("prompt_n")
+        prompt_tokens = usage.get("prompt_tokens") or (prompt_n or 0) + (timings.get("cache_n") or 0)
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        if cached is None:
+            cached = timings.get("cache_n")
+        if cached is None and prompt_n is not None and prompt_tokens:
+            cached = max(prompt_tokens - prompt_n, 0)
+        if cached is None:
+            return
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached
+        saved = 0.0
+        if prompt_n and timings.get("prompt_ms") is not None:
+            self.prefill_ms += timings["prompt_ms"]
+            saved = cached * timings["prompt_ms"] / prompt_n
+            self.prefill_ms_saved += saved
+        logging.info(f"Turn {self.turns}: {cached}/{prompt_tokens} prompt tokens served from the prefix cache, ~{saved:.0f} ms prefill saved")
+
+    def stats(self):
+        return {
+            "turns": self.turns,
+            "compactions": self.compactions,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "prefill_ms": self.prefill_ms,
+            "prefill_ms_saved": self.prefill_ms_saved,
+        }
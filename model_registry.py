@@ -0,0 +1,146 @@
+import gc
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+# RAM the loaded local models may use together; least recently used models are unloaded beyond it
+MEMORY_BUDGET = 8 * 2**30  # Bytes
+
+# Define a function to read the resident set size of this process in bytes (None where /proc is unavailable)
+def resident_memory():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+# A model held by the registry, with the resident memory its load added
+class LoadedModel:
+    def __init__(self, name, model, size, load_seconds):
+        self.name = name
+        self.model = model
+        self.size = size
+        self.load_seconds = load_seconds
+
+# Loads local models by name on first use and shares them between operators. Each model's size is
+# the growth in resident memory while it loaded (or the size given at registration). When the total
+# exceeds the budget the least recently used models are dropped; callers still holding one keep it
+# alive until they let go of it.
+class ModelRegistry:
+    def __init__(self, budget=MEMORY_BUDGET):
+        self.budget = budget
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self._loaders = {}
+        self._declared_sizes = {}
+        self._sizes = {}  # Last known size per name, used to make room before reloading
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        # Loads run one at a time so each resident memory measurement belongs to one model
+        self._load_lock = threading.Lock()
+
+    # Register how to load a model; `size` (bytes) overrides the measured footprint
+    def register(self, name, loader, size=None):
+        self._loaders[name] = loader
+        if size is not None:
+            self._declared_sizes[name] = size
+
+    # Return a loaded model, loading it with its registered (or the given) loader on first use
+    def get(self, name, loader=None):
+        model = self._lookup(name)
+        if model is not None:
+            return model
+        loader = loader or self._loaders.get(name)
+        if loader is None:
+            raise KeyError(f"No loader registered for model '{name}'")
+        with self._load_lock:
+            model = self._lookup(name)
+            if model is not None:
+                return model
+            self._evict(self._declared_sizes.get(name) or self._sizes.get(name, 0), keep=None)
+            before = resident_memory()
+            start = time.perf_counter()
+            model = loader()
+            load_seconds = time.perf_counter() - start
+            measured = max(resident_memory() - before, 0) if before is not None else 0
+            size = self._sizes[name] = self._declared_sizes.get(name) or measured
+            with self._lock:
+                self._models[name] = LoadedModel(name, model, size, load_seconds)
+                self.loads += 1
+            logging.info(f"Loaded model '{name}' in {load_seconds:.1f}s ({size / 2**20:.0f} MB)")
+            self._evict(0, keep=name)
+        return model
+
+    def _lookup(self, name):
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is None:
+                return None
+            self._models.move_to_end(name)
+            self.hits += 1
+            return entry.model
+
+    # Unload least recently used models until `needed` more bytes fit into the budget
+    def _evict(self, needed, keep):
+        evicted = []
+        with self._lock:
+            while self._models and self.used() + needed > self.budget:
+                name = next(iter(self._models))
+                if name == keep:
+                    break
+                evicted.append(self._models.pop(name))
+                self.evictions += 1
+        for entry in evicted:
+            logging.info(f"Unloaded model '{entry.name}' ({entry.size / 2**20:.0f} MB) to stay within the memory budget")
+            self._release(entry)
+        if evicted:
+            gc.collect()
+
+    # Drop the registry's reference; the memory is freed once no caller holds the model any more
+    def _release(self, entry):
+        entry.model = None
+
+    # Return the bytes used by the loaded models
+    def used(self):
+        return sum(entry.size for entry in self._models.values())
+
+    # Unload one model
+    def unload(self, name):
+        with self._lock:
+            entry = self._models.pop(name, None)
+        if entry is not None:
+            self._release(entry)
+            gc.collect()
+
+    # Unload every model (called on add-on unregister)
+    def clear(self):
+        with self._lock:
+            entries = list(self._models.values())
+            self._models.clear()
+        for entry in entries:
+            self._release(entry)
+        if entries:
+            gc.collect()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+                "used": self.used(),
+                "budget": self.budget,
+                "models": {entry.name: entry.size for entry in self._models.values()},
+            }
+
+# Registry shared by all operators of the add-on
+default_registry = ModelRegistry()
+
+# Define a function to change the memory budget (bytes) of the shared registry
+def configure(budget=MEMORY_BUDGET):
+    default_registry.budget = budget
+    default_registry._evict(0, keep=None)
+    return default_registry
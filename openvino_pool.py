@@ -0,0 +1,158 @@
+import queue
+import weakref
+import logging
+import threading
+from concurrent.futures import Future
+import numpy as np
+
+# Compilation defaults: device and OpenVINO performance hint ("THROUGHPUT" runs several requests in
+# parallel streams, "LATENCY" gives one request the whole device)
+DEVICE = "CPU"
+PERFORMANCE_MODE = "THROUGHPUT"
+POOL_SIZE = 0  # Infer requests per pool; 0 uses the device's OPTIMAL_NUMBER_OF_INFER_REQUESTS
+
+# Define a function to compile an OpenVINO model with a performance hint.
+# With dynamic_batch the first axis of a single-input model is made dynamic, so the batching executor
+# can run batches of any size. Models with several inputs are never batched and stay static, which
+# lets InferencePool preallocate their input buffers.
+def compile_model(model_path, device=DEVICE, mode=PERFORMANCE_MODE, dynamic_batch=False):
+    import openvino as ov  # Heavy import, deferred until first use
+    core = ov.Core()
+    model = core.read_model(model_path)
+    if dynamic_batch and len(model.inputs) == 1:
+        port = model.inputs[0]
+        model.reshape({port.any_name: ov.PartialShape([-1, *port.partial_shape[1:]])})
+    return core.compile_model(model, device, {"PERFORMANCE_HINT": mode})
+
+# Define a function to tell whether a compiled model accepts any batch size (dynamic first axis)
+def batchable(compiled_model):
+    return len(compiled_model.inputs) == 1 and compiled_model.inputs[0].partial_shape[0].is_dynamic
+
+# A fixed set of infer requests over one compiled model, in the spirit of openvino.AsyncInferQueue.
+# Every request owns preallocated numpy input arrays that its input tensors share memory with, so
+# inputs are written straight into the tensors the device reads. Submitting blocks only while all
+# requests are busy; results come back as futures, so several inputs are in flight at once.
+class InferencePool:
+    def __init__(self, compiled_model, size=POOL_SIZE):
+        import openvino as ov
+        size = size or compiled_model.get_property("OPTIMAL_NUMBER_OF_INFER_REQUESTS")
+        self.output_count = len(compiled_model.outputs)
+        self.requests = []
+        self.buffers = []
+        self._tensors = []
+        self._rebound = []
+        self.completed = 0
+        self._futures = [None] * size
+        self._idle = queue.SimpleQueue()
+        self._busy = 0
+        self._all_idle = threading.Condition()
+        for request_id in range(size):
+            request = compiled_model.create_infer_request()
+            arrays, tensors = [], []
+            for index, port in enumerate(compiled_model.inputs):
+                # Dynamic inputs cannot be preallocated; they are bound per call in start()
+                array = tensor = None
+                if port.partial_shape.is_static:
+                    array = np.zeros(tuple(port.shape), dtype=port.element_type.to_dtype())
+                    tensor = ov.Tensor(array, shared_memory=True)
+                    request.set_input_tensor(index, tensor)
+                arrays.append(array)
+                tensors.append(tensor)
+            request.set_callback(self._on_complete, request_id)
+            self.requests.append(request)
+            self.buffers.append(arrays)
+            self._tensors.append(tensors)
+            self._rebound.append([False] * len(arrays))
+            self._idle.put(request_id)
+        logging.info(f"OpenVINO inference pool: {size} infer requests")
+
+    def __len__(self):
+        return len(self.requests)
+
+    # Reserve an idle request, waiting for one to finish if all are busy; returns its id.
+    # Write inputs into buffers[request_id] in place, then call start(request_id).
+    def acquire(self):
+        request_id = self._idle.get()
+        with self._all_idle:
+            self._busy += 1
+        return request_id
+
+    # Start a reserved request. Inputs passed here are bound without copying and must stay unchanged
+    # until it finishes; None (or no argument) uses the request's preallocated buffer.
+    def start(self, request_id, *inputs):
+        import openvino as ov
+        request = self.requests[request_id]
+        rebound = self._rebound[request_id]
+        for index, data in enumerate(inputs):
+            if data is not None:
+                request.set_input_tensor(index, ov.Tensor(np.ascontiguousarray(data), shared_memory=True))
+                rebound[index] = True
+            elif rebound[index]:
+                # Point the request back at its preallocated buffer after a zero-copy call
+                request.set_input_tensor(index, self._tensors[request_id][index])
+                rebound[index] = False
+        future = self._futures[request_id] = Future()
+        future.inputs = inputs  # Keeps the bound arrays alive until the request completes
+        request.start_async()
+        return future
+
+    # Copy inputs into a request's preallocated tensors and start it; returns a Future of the outputs
+    def submit(self, *inputs):
+        request_id = self.acquire()
+        bound = []
+        for buffer, data in zip(self.buffers[request_id], inputs):
+            if buffer is None:
+                bound.append(data)
+            else:
+                np.copyto(buffer, data, casting="same_kind")
+                bound.append(None)
+        return self.start(request_id, *bound)
+
+    # Run one input synchronously
+    def infer(self, *inputs):
+        return self.submit(*inputs).result()
+
+    # Run many inputs pipelined over the pool; results come back in input order
+    def map(self, inputs):
+        futures = [self.submit(*(item if isinstance(item, tuple) else (item,))) for item in inputs]
+        return [future.result() for future in futures]
+
+    # Called by OpenVINO on its own thread when a request finishes
+    def _on_complete(self, request_id):
+        request = self.requests[request_id]
+        future = self._futures[request_id]
+        self._futures[request_id] = None
+        try:
+            # Output tensors are reused by the next inference on this request, so results are copied out
+            outputs = [request.get_output_tensor(index).data.copy() for index in range(self.output_count)]
+            result = outputs[0] if len(outputs) == 1 else outputs
+        except Exception as e:
+            result, error = None, e
+        else:
+            error = None
+        self._idle.put(request_id)
+        with self._all_idle:
+            self._busy -= 1
+            self.completed += 1
+            self._all_idle.notify_all()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    # Block until every started request has finished
+    def wait_all(self):
+        with self._all_idle:
+            self._all_idle.wait_for(lambda: self._busy == 0)
+
+_pools = weakref.WeakKeyDictionary()
+_pools_lock = threading.Lock()
+
+# Define a function to get the inference pool of a compiled model, creating it on first use.
+# Pools do not keep their compiled model alive, so they go away together.
+def pool_for(compiled_model, size=POOL_SIZE):
+    with _pools_lock:
+        pool = _pools.get(compiled_model)
+        if pool is None:
+            pool = _pools[compiled_model] = InferencePool(compiled_model, size)
+        return pool
@@ -6,8 +6,7 @@ from pydantic import BaseModel
 import uvicorn
 import asyncio
 import numpy as np
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
-from openml import datasets
+from . import lm_client
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
@@ -45,7 +44,7 @@ class GPT4BlenderOperator(bpy.types.Operator):
         system_prompt = "You are an assistant designed to help with Blender modeling tasks."
         # Get response from model
         prompt = context.scene.gpt4_chat_input
-        response_content = requests.post("http://127.0.0.1:8000/model_chat/", json={"prompt": prompt, "chat_history": chat_history}).json()
+        response_content = lm_client.post("http://127.0.0.1:8000/model_chat/", json={"prompt": prompt, "chat_history": chat_history}).json()
         logging.info(f"Model Response: {response_content}")
         # Add response to chat history
         new_message = bpy.types.PropertyGroup()
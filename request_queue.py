@@ -0,0 +1,119 @@
+import time
+import asyncio
+import logging
+import threading
+from . import lm_client
+
+# Batching settings: how long to collect prompts, how many per batch, how many requests at once
+BATCH_WINDOW = 0.05  # Seconds
+MAX_BATCH = 8
+MAX_INFLIGHT = 4
+
+# Queue, collector and in-flight tasks of a RequestQueue on one event loop
+class _LoopState:
+    def __init__(self, max_inflight):
+        self.queue = asyncio.Queue()
+        self.semaphore = asyncio.Semaphore(max_inflight)
+        self.tasks = set()
+
+    def spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+# Async queue in front of an LM Studio endpoint. Prompts submitted within BATCH_WINDOW (or until
+# MAX_BATCH are waiting) are sent together, at most MAX_INFLIGHT at a time, over the pooled client.
+# Each caller gets its own response back.
+class RequestQueue:
+    def __init__(self, url, headers=None, max_batch=MAX_BATCH, window=BATCH_WINDOW, max_inflight=MAX_INFLIGHT):
+        self.url = url
+        self.headers = headers
+        self.max_batch = max_batch
+        self.window = window
+        self.max_inflight = max_inflight
+        self.requests = 0
+        self.tokens = 0
+        self.batches = 0
+        self._started_at = None
+        self._finished_at = None
+        self._states = {}  # Event loop -> _LoopState
+        self._states_lock = threading.Lock()
+
+    # Every event loop using the queue (the scheduler's, each asyncio.run) gets its own queue and
+    # collector, so loops never share asyncio objects; states of closed loops are dropped
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        with self._states_lock:
+            state = self._states.get(loop)
+            if state is None:
+                for closed in [other for other in self._states if other.is_closed()]:
+                    del self._states[closed]
+                state = self._states[loop] = _LoopState(self.max_inflight)
+                state.spawn(self._collect(state))
+        return state
+
+    # Queue one payload and wait for its response JSON
+    async def submit(self, payload):
+        state = self._ensure_worker()
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        await state.queue.put((payload, future))
+        return await future
+
+    # Submit several payloads; responses come back in the same order
+    async def map(self, payloads, return_exceptions=False):
+        return await asyncio.gather(*(self.submit(payload) for payload in payloads), return_exceptions=return_exceptions)
+
+    async def _collect(self, state):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await state.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(state.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self.batches += 1
+            logging.debug(f"Dispatching batch of {len(batch)} requests")
+            for payload, future in batch:
+                state.spawn(self._send(state, payload, future))
+
+    async def _send(self, state, payload, future):
+        async with state.semaphore:
+            try:
+                response = await asyncio.to_thread(lm_client.post_json, self.url, payload, self.headers)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+        self._record(response)
+        if not future.done():
+            future.set_result(response)
+
+    def _record(self, response):
+        usage = response.get("usage") or {}
+        # Servers that do not report usage: estimate ~4 characters per token
+        self.tokens += usage.get("completion_tokens") or len(lm_client.completion_text(response, "")) // 4
+        self.requests += 1
+        self._finished_at = time.perf_counter()
+
+    # Start a new measurement period for stats()
+    def reset_stats(self):
+        self.requests = self.tokens = self.batches = 0
+        self._started_at = self._finished_at = None
+
+    # Return request/token counts and throughput since the first submission
+    def stats(self):
+        elapsed = (self._finished_at or 0) - (self._started_at or 0)
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "tokens": self.tokens,
+            "requests_per_s": self.requests / elapsed if elapsed > 0 else 0.0,
+            "tokens_per_s": self.tokens / elapsed if elapsed > 0 else 0.0,
+        }
@@ -0,0 +1,140 @@
+import time
+import random
+import logging
+import threading
+import requests
+from urllib.parse import urlsplit
+from . import lm_client
+
+# Per-request budget and retry policy
+CONNECT_TIMEOUT = 5.0  # Seconds to establish a connection
+DEFAULT_DEADLINE = 180.0  # Seconds for the whole request, retries included (until the response headers when streaming)
+STREAM_IDLE_TIMEOUT = 60.0  # Seconds a token stream may go without data; long streams are otherwise unbounded
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.5  # Seconds; the delay cap doubles with every retry
+BACKOFF_MAX = 8.0
+# Circuit breaker: consecutive failures that open it, and the interval of background probes while open
+FAILURE_THRESHOLD = 3
+PROBE_INTERVAL = 10.0
+PROBE_PATH = "/v1/models"
+
+# Raised without contacting the server while its circuit is open
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    pass
+
+# Raised when a request's deadline has passed
+class DeadlineExceeded(requests.exceptions.Timeout):
+    pass
+
+# Raised when a token stream sends nothing for STREAM_IDLE_TIMEOUT seconds
+class StreamStalled(requests.exceptions.Timeout):
+    pass
+
+counters = {"retries": 0, "open_circuit_rejections": 0, "timeouts": 0, "failures": 0}
+_counters_lock = threading.Lock()
+
+def _count(name):
+    with _counters_lock:
+        counters[name] += 1
+
+# Define a function to return a snapshot of the resilience counters and circuit states
+def stats():
+    with _counters_lock:
+        snapshot = dict(counters)
+    snapshot["circuits"] = {endpoint: breaker.state for endpoint, breaker in _breakers.items()}
+    return snapshot
+
+# Define a function to compute a jittered exponential backoff delay ("full jitter")
+def backoff_delay(attempt):
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+# Per-endpoint circuit breaker. After FAILURE_THRESHOLD consecutive failures requests fail fast
+# while a background thread probes the endpoint; the first successful probe closes the circuit.
+class CircuitBreaker:
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.state = self.CLOSED
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        if self.state == self.OPEN:
+            _count("open_circuit_rejections")
+            raise CircuitOpenError(f"{self.endpoint} is unavailable (circuit open)")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures < FAILURE_THRESHOLD or self.state == self.OPEN:
+                return
+            self.state = self.OPEN
+        logging.warning(f"Circuit opened for {self.endpoint} after {self.failures} failures")
+        threading.Thread(target=self._probe, name=f"probe {self.endpoint}", daemon=True).start()
+
+    def _probe(self):
+        while self.state == self.OPEN:
+            time.sleep(PROBE_INTERVAL)
+            try:
+                response = lm_client.get_session().get(self.endpoint + PROBE_PATH, timeout=CONNECT_TIMEOUT)
+                response.close()
+            except requests.exceptions.RequestException:
+                continue
+            # Any answer except "unavailable"-style gateway errors means the server is back
+            if response.status_code not in (502, 503, 504):
+                self.record_success()
+                logging.info(f"Circuit closed for {self.endpoint}")
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# Define a function to get the circuit breaker of the endpoint (scheme://host:port) serving a URL
+def breaker_for(url):
+    parts = urlsplit(url)
+    endpoint = f"{parts.scheme}://{parts.netloc}"
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(endpoint)
+        return _breakers[endpoint]
+
+# Define a function to send a request with a deadline, retries and the endpoint's circuit breaker.
+# `send(timeout)` performs one attempt and returns the response; 5xx/429 answers are retried.
+# Backoff sleeps only happen on worker threads: on Blender's main thread a single attempt is made.
+def call(url, send, attempts=MAX_ATTEMPTS, deadline=DEFAULT_DEADLINE):
+    breaker = breaker_for(url)
+    expires = time.monotonic() + deadline
+    on_main_thread = threading.current_thread() is threading.main_thread()
+    attempt = 0
+    while True:
+        breaker.before_request()
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            _count("timeouts")
+            raise DeadlineExceeded(f"Deadline of {deadline:.0f}s exceeded for {url}")
+        try:
+            response = send((min(CONNECT_TIMEOUT, remaining), remaining))
+            if response.status_code >= 500 or response.status_code == 429:
+                response.close()
+                raise requests.exceptions.HTTPError(f"{response.status_code} from {url}", response=response)
+            breaker.record_success()
+            return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.HTTPError) as e:
+            _count("failures")
+            if isinstance(e, requests.exceptions.Timeout):
+                _count("timeouts")
+            if not (isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 429):
+                breaker.record_failure()
+            delay = backoff_delay(attempt)
+            attempt += 1
+            if attempt >= attempts or on_main_thread or time.monotonic() + delay >= expires:
+                raise
+            logging.warning(f"Request to {url} failed ({e}), retry {attempt} in {delay:.2f}s")
+            _count("retries")
+            time.sleep(delay)
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Cache limits: in-memory LRU and the optional SQLite store, both bounded by stored bytes
+MEMORY_MAX_BYTES = 64 * 1024 * 1024
+DISK_MAX_BYTES = 512 * 1024 * 1024
+# Payload fields that change how a response is delivered but not what it says
+IGNORED_FIELDS = ("stream", "cache_prompt", "id_slot", "user")
+
+# Define a function to normalize chat messages so whitespace-only differences share a cache entry
+def normalize_messages(messages):
+    return [
+        {"role": str(message.get("role", "")).strip().lower(), "content": " ".join(str(message.get("content", "")).split())}
+        for message in messages
+    ]
+
+# Define a function to compute the canonical cache key of a request payload.
+# Covers model, messages, temperature, top_p, max_tokens and any other sampling field sent.
+def cache_key(payload):
+    canonical = {key: value for key, value in payload.items() if key not in IGNORED_FIELDS}
+    if "messages" in canonical:
+        canonical["messages"] = normalize_messages(canonical["messages"])
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+# Response cache with a byte-bounded in-memory LRU in front of an optional SQLite store
+class ResponseCache:
+    def __init__(self, max_bytes=MEMORY_MAX_BYTES, path=None, disk_max_bytes=DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, size INTEGER, last_used REAL)")
+            self._db.commit()
+
+    # Return the cached response text for a key, or None
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+                if row:
+                    value = row[0]
+                    self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._remember(key, value)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    # Store the response text for a key in memory and, if configured, on disk
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, value, len(value.encode("utf-8")), time.time()))
+                self._prune_disk()
+                self._db.commit()
+
+    def _remember(self, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key).encode("utf-8"))
+        self._entries[key] = value
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.encode("utf-8"))
+            self.evictions += 1
+
+    def _prune_disk(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return
+        freed = 0
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total - freed <= self.disk_max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            freed += size
+
+    # Drop every entry, in memory and on disk
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    # Return hit/miss counters and current sizes
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+# Shared cache used by lm_client; replaced by configure()
+default_cache = ResponseCache()
+
+# Define a function to replace the shared cache, e.g. to persist it under Blender's config directory
+def configure(path=None, max_bytes=MEMORY_MAX_BYTES, disk_max_bytes=DISK_MAX_BYTES):
+    global default_cache
+    old_cache, default_cache = default_cache, ResponseCache(max_bytes, path, disk_max_bytes)
+    old_cache.close()
+    logging.info(f"Response cache configured: {max_bytes} bytes in memory, store {path or 'disabled'}")
+    return default_cache
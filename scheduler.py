@@ -0,0 +1,146 @@
+import bpy
+import time
+import asyncio
+import logging
+import threading
+import itertools
+from collections import deque
+
+# Main-thread budget: how often finished jobs are polled and how long each poll may spend applying them
+POLL_INTERVAL = 0.05  # Seconds
+APPLY_TIME_SLICE = 0.005  # Seconds
+
+# Job states
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+DONE = "DONE"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+
+_job_ids = itertools.count(1)
+
+# A unit of background work; `on_done(job)` is called on Blender's main thread once it has finished
+class Job:
+    def __init__(self, name, on_done=None):
+        self.id = next(_job_ids)
+        self.name = name
+        self.state = PENDING
+        self.result = None
+        self.error = None
+        self.on_done = on_done
+        self.created_at = time.perf_counter()
+        self.finished_at = None
+        self._future = None
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    # Cancel the job; a running coroutine receives CancelledError at its next await
+    def cancel(self):
+        if self._future is not None and not self.finished:
+            self._future.cancel()
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.name} {self.state}>"
+
+# Runs coroutines on an asyncio loop in a worker thread and hands finished jobs back to the
+# main thread through a bpy.app.timers poller, so the UI never waits on the network.
+class Scheduler:
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._jobs = set()
+        self._finished = deque()
+        self._lock = threading.Lock()
+        self._polling = False
+        # Keep one bound method so bpy.app.timers sees the same callback object every time
+        self._poll_callback = self._poll
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="ai-scheduler", daemon=True)
+                self._thread.start()
+
+    # Schedule `function(*args)`: coroutine functions run on the worker loop, plain functions in its thread pool
+    def submit(self, function, *args, name=None, on_done=None):
+        self._ensure_started()
+        job = Job(name or function.__name__, on_done)
+        with self._lock:
+            self._jobs.add(job)
+        job._future = asyncio.run_coroutine_threadsafe(self._run(job, function, args), self._loop)
+        # A job cancelled before it started never enters _run
+        job._future.add_done_callback(lambda future: self._cancelled_early(job) if future.cancelled() else None)
+        if not self._polling:
+            self._polling = True
+            bpy.app.timers.register(self._poll_callback, first_interval=POLL_INTERVAL)
+        return job
+
+    async def _run(self, job, function, args):
+        job.state = RUNNING
+        try:
+            if asyncio.iscoroutinefunction(function):
+                job.result = await function(*args)
+            else:
+                job.result = await asyncio.to_thread(function, *args)
+            job.state = DONE
+        except asyncio.CancelledError:
+            job.state = CANCELLED
+        except Exception as e:
+            logging.error(f"Job {job.name} failed: {e}")
+            job.error = e
+            job.state = FAILED
+        finally:
+            self._finish(job)
+
+    def _cancelled_early(self, job):
+        if not job.finished:
+            job.state = CANCELLED
+            self._finish(job)
+
+    def _finish(self, job):
+        if job.finished_at is None:
+            job.finished_at = time.perf_counter()
+            self._finished.append(job)
+
+    # Timer callback: apply finished jobs on the main thread within APPLY_TIME_SLICE
+    def _poll(self):
+        deadline = time.perf_counter() + APPLY_TIME_SLICE
+        while self._finished and time.perf_counter() < deadline:
+            job = self._finished.popleft()
+            with self._lock:
+                self._jobs.discard(job)
+            if job.on_done is not None:
+                try:
+                    job.on_done(job)
+                except Exception as e:
+                    logging.error(f"Applying job {job.name} failed: {e}")
+        with self._lock:
+            if not self._jobs and not self._finished:
+                self._polling = False
+                return None
+        return POLL_INTERVAL
+
+    # Return the jobs that have not been applied yet
+    def jobs(self):
+        with self._lock:
+            return sorted(self._jobs, key=lambda job: job.id)
+
+    # Cancel every job and stop the worker thread (called on add-on unregister)
+    def shutdown(self):
+        for job in self.jobs():
+            job.cancel()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=1.0)
+        if self._polling and bpy.app.timers.is_registered(self._poll_callback):
+            bpy.app.timers.unregister(self._poll_callback)
+        self._polling = False
+        self._jobs.clear()
+        self._finished.clear()
+        self._thread = self._loop = None
+
+# Scheduler shared by all operators of the add-on
+default_scheduler = Scheduler()
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import logging
+import threading
+import numpy as np
+from . import lm_client, response_cache
+
+# Embedding endpoint (OpenAI-compatible /v1/embeddings) and matching settings
+EMBEDDING_URL = "http://localhost:5000/v1/embeddings"
+EMBEDDING_MODEL = "nomic-embed-text-v1.5"
+SIMILARITY_THRESHOLD = 0.95  # Minimum cosine similarity to serve a cached response
+TOP_K = 5
+INITIAL_CAPACITY = 1024  # Rows reserved in the embedding matrix (grown by doubling)
+EMBEDDING_TIMEOUT = (1.0, 5.0)  # Connect and read timeouts (seconds) of the single embedding attempt
+EMBEDDING_RETRY_INTERVAL = 60.0  # Seconds semantic lookups are skipped after an embedding failure
+
+# Define a function to embed a text as a unit-length float32 vector.
+# One short attempt, sent directly rather than through post_json, so a server without
+# /v1/embeddings never trips the chat endpoint's retries, circuit breaker or load balancing.
+def embed(text):
+    response = lm_client.post(EMBEDDING_URL, json={"model": EMBEDDING_MODEL, "input": text}, timeout=EMBEDDING_TIMEOUT)
+    response.raise_for_status()
+    vector = np.asarray(response.json()["data"][0]["embedding"], dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+# Define a function to split a chat payload into the prompt to embed and the scope it was asked in.
+# The scope hashes everything except the last user message, so matches never cross models,
+# system prompts or sampling settings.
+def prompt_and_scope(payload):
+    messages = payload.get("messages") or []
+    if not messages or messages[-1].get("role") != "user":
+        return None, None
+    scope = response_cache.cache_key({**payload, "messages": messages[:-1]})
+    return messages[-1]["content"], np.uint64(int(scope[:16], 16))
+
+# Nearest-neighbour index over prompt embeddings.
+# Embeddings live in one contiguous float32 matrix, memory-mapped from `directory` when given;
+# entries (prompt and response text) are appended to entries.jsonl next to it.
+class SemanticIndex:
+    def __init__(self, directory=None, threshold=SIMILARITY_THRESHOLD):
+        self.directory = directory
+        self.threshold = threshold
+        self._retry_at = 0.0  # Monotonic time before which no embeddings are requested
+        self.hits = 0
+        self.misses = 0
+        self.count = 0
+        self._matrix = None
+        self._scopes = np.empty(INITIAL_CAPACITY, dtype=np.uint64)
+        self._entries = []
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    def _paths(self):
+        return os.path.join(self.directory, "embeddings.f32"), os.path.join(self.directory, "entries.jsonl")
+
+    def _load(self):
+        matrix_path, entries_path = self._paths()
+        if not os.path.exists(entries_path) or not os.path.exists(matrix_path):
+            return
+        with open(entries_path, encoding="utf-8") as entries_file:
+            self._entries = [json.loads(line) for line in entries_file if line.strip()]
+        if not self._entries:
+            return
+        dimensions = self._entries[0]["dimensions"]
+        capacity = os.path.getsize(matrix_path) // (4 * dimensions)
+        self.count = min(len(self._entries), capacity)
+        self._entries = self._entries[:self.count]
+        self._matrix = np.memmap(matrix_path, dtype=np.float32, mode="r+", shape=(capacity, dimensions))
+        self._scopes = np.empty(max(capacity, INITIAL_CAPACITY), dtype=np.uint64)
+        self._scopes[:self.count] = [int(entry["scope"]) for entry in self._entries]
+
+    # Reserve room for one more row, doubling the matrix (and its file) when full
+    def _reserve(self, dimensions):
+        capacity = 0 if self._matrix is None else len(self._matrix)
+        if self.count < capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, 2 * capacity)
+        if self.directory:
+            matrix_path, _ = self._paths()
+            if self._matrix is not None:
+                self._matrix.flush()
+            with open(matrix_path, "ab") as matrix_file:
+                matrix_file.truncate(capacity * dimensions * 4)
+            self._matrix = np.memmap(matrix_path, dtype=np.float32, mode="r+", shape=(capacity, dimensions))
+        else:
+            grown = np.empty((capacity, dimensions), dtype=np.float32)
+            if self._matrix is not None:
+                grown[:self.count] = self._matrix[:self.count]
+            self._matrix = grown
+        scopes = np.empty(capacity, dtype=np.uint64)
+        scopes[:self.count] = self._scopes[:self.count]
+        self._scopes = scopes
+
+    # Append an embedded prompt and its response
+    def add(self, embedding, scope, prompt, value):
+        with self._lock:
+            self._reserve(len(embedding))
+            self._matrix[self.count] = embedding
+            self._scopes[self.count] = scope
+            entry = {"prompt": prompt, "value": value, "scope": str(int(scope)), "dimensions": len(embedding)}
+            self._entries.append(entry)
+            self.count += 1
+            if self.directory:
+                self._matrix.flush()
+                with open(self._paths()[1], "a", encoding="utf-8") as entries_file:
+                    entries_file.write(json.dumps(entry) + "\n")
+
+    # Return up to k (similarity, entry) pairs within a scope, best first, in one matrix-vector pass
+    def search(self, embedding, scope, k=TOP_K):
+        with self._lock:
+            if self.count == 0 or len(embedding) != self._matrix.shape[1]:
+                return []
+            similarities = self._matrix[:self.count] @ embedding
+            similarities[self._scopes[:self.count] != scope] = -np.inf
+            k = min(k, self.count)
+            best = np.argpartition(-similarities, k - 1)[:k]
+            best = best[np.argsort(-similarities[best])]
+            return [(float(similarities[i]), self._entries[i]) for i in best if np.isfinite(similarities[i])]
+
+    # Return the cached response for a similar prompt, or None
+    def lookup(self, payload):
+        prompt, scope = prompt_and_scope(payload)
+        embedding = self._embed(prompt)
+        if embedding is None:
+            return None
+        matches = self.search(embedding, scope, k=1)
+        if matches and matches[0][0] >= self.threshold:
+            self.hits += 1
+            logging.info(f"Semantic cache hit ({matches[0][0]:.3f}): '{matches[0][1]['prompt']}'")
+            return matches[0][1]["value"]
+        self.misses += 1
+        return None
+
+    # Remember the response for a payload's prompt
+    def store(self, payload, value):
+        prompt, scope = prompt_and_scope(payload)
+        embedding = self._embed(prompt)
+        if embedding is not None:
+            self.add(embedding, scope, prompt, value)
+
+    # False while lookups are paused after an embedding failure
+    @property
+    def available(self):
+        return time.monotonic() >= self._retry_at
+
+    def _embed(self, prompt):
+        if prompt is None or not self.available:
+            return None
+        try:
+            return embed(prompt)
+        except Exception as e:
+            # No embedding model loaded (or the server is busy): serve exact-match hits only for a while
+            logging.warning(f"Semantic cache paused for {EMBEDDING_RETRY_INTERVAL:.0f}s, embedding failed: {e}")
+            self._retry_at = time.monotonic() + EMBEDDING_RETRY_INTERVAL
+            return None
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": self.count}
+
+# Shared index used by lm_client; None until configure() is called
+default_index = None
+
+# Define a function to enable the semantic cache, persisted under `directory` when given
+def configure(directory=None, threshold=SIMILARITY_THRESHOLD):
+    global default_index
+    default_index = SemanticIndex(directory, threshold)
+    logging.info(f"Semantic cache configured: {default_index.count} entries, threshold {threshold}")
+    return default_index
@@ -0,0 +1,14 @@
+# The add-on package imports bpy, so the modules that work without Blender are tested as top-level
+# modules from the add-on directory (as benchmarks.py does). Modules with relative imports are loaded
+# from the same directory as the package ADDON_PACKAGE, without running the add-on's __init__.py.
+import os
+import sys
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON_PACKAGE = "ssd_mesh_extension"
+
+sys.path[:0] = [ADDON_DIR, os.path.join(ADDON_DIR, "lib")]
+package = types.ModuleType(ADDON_PACKAGE)
+package.__path__ = [ADDON_DIR]
+sys.modules.setdefault(ADDON_PACKAGE, package)
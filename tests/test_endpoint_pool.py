@@ -0,0 +1,61 @@
+import ast
+import os
+from conftest import ADDON_DIR
+from ssd_mesh_extension import endpoint_pool, resilience
+
+# Define a function to read a module-level URL constant from an add-on module without importing it
+# (the call sites import bpy)
+def call_site_url(module, name):
+    with open(os.path.join(ADDON_DIR, module), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(target, "id", None) == name for target in node.targets):
+            return ast.literal_eval(node.value)
+    raise AssertionError(f"{name} not found in {module}")
+
+def pool(monkeypatch, *urls):
+    configured = endpoint_pool.EndpointPool([(url, 1.0) for url in urls])
+    monkeypatch.setattr(endpoint_pool, "default_pool", configured)
+    return configured
+
+def test_call_site_urls_are_routed_to_the_pool(monkeypatch):
+    pool(monkeypatch, "http://localhost:5000", "http://gpu-box:5000")
+    for module, name in [("__init__.py", "LM_STUDIO_URL"), ("utilities.py", "LM_STUDIO_API_URL"), ("ai_interaction.py", "API_URL")]:
+        endpoint, url = endpoint_pool.route(call_site_url(module, name))
+        assert endpoint is not None, f"{module}:{name} bypasses the endpoint pool"
+        assert url == endpoint.url + "/v1/chat/completions"
+        endpoint_pool.release(endpoint)
+
+def test_loopback_spellings_match_the_same_endpoint(monkeypatch):
+    configured = pool(monkeypatch, "http://localhost:5000")
+    for url in ["http://127.0.0.1:5000/v1/models", "http://LOCALHOST:5000/v1/models", "http://[::1]:5000/v1/models"]:
+        assert url in configured
+    assert "http://localhost:1234/v1/models" not in configured
+    assert "http://example.com:5000/v1/models" not in configured
+
+def test_urls_outside_the_pool_are_unchanged(monkeypatch):
+    pool(monkeypatch, "http://localhost:5000")
+    assert endpoint_pool.route("http://127.0.0.1:8000/model_chat/") == (None, "http://127.0.0.1:8000/model_chat/")
+
+def test_least_loaded_endpoint_is_chosen(monkeypatch):
+    configured = pool(monkeypatch, "http://a:5000", "http://b:5000")
+    first = configured.acquire()
+    second = configured.acquire()
+    assert {first.url, second.url} == {"http://a:5000", "http://b:5000"}
+    configured.release(first, 0.5)
+    configured.release(second, 0.1)
+    assert configured.acquire().url == second.url
+
+def test_conversation_sticks_to_one_endpoint(monkeypatch):
+    configured = pool(monkeypatch, "http://a:5000", "http://b:5000")
+    payload = {"model": "m", "user": "conversation-1", "messages": [{"role": "system", "content": "s"}]}
+    endpoint, _ = endpoint_pool.route("http://a:5000/v1/chat/completions", payload)
+    # Load the chosen endpoint so the balancer alone would pick the other one
+    endpoint.outstanding += 5
+    again, _ = endpoint_pool.route("http://a:5000/v1/chat/completions", {**payload, "messages": payload["messages"] + [{"role": "user", "content": "hi"}]})
+    assert again is endpoint
+
+def test_open_circuit_endpoint_is_skipped(monkeypatch):
+    configured = pool(monkeypatch, "http://down:5000", "http://up:5000")
+    monkeypatch.setattr(resilience.breaker_for("http://down:5000"), "state", resilience.CircuitBreaker.OPEN)
+    assert all(configured.acquire().url == "http://up:5000" for _ in range(3))
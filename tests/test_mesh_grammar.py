@@ -0,0 +1,31 @@
+import re
+import pytest
+import mesh_grammar
+
+# Define a function to turn integer_range's GBNF alternation (digit literals and classes) into a regex
+def range_pattern(low, high):
+    return re.compile(mesh_grammar.integer_range(low, high).replace('"', "").replace(" ", ""))
+
+@pytest.mark.parametrize("low, high", [(0, 0), (0, 9), (0, 63), (1, 2000), (5, 5), (7, 13), (95, 105), (123, 4567)])
+def test_integer_range_matches_exactly_the_range(low, high):
+    pattern = range_pattern(low, high)
+    matched = [number for number in range(0, 2 * high + 20) if pattern.fullmatch(str(number))]
+    assert matched == list(range(low, high + 1))
+
+def test_integer_range_rejects_leading_zeros():
+    pattern = range_pattern(0, 63)
+    assert not pattern.fullmatch("07")
+
+def test_validate_obj_reports_problems():
+    text = "Here is the mesh:\nv 0 0 0\nv 63 0 0\nv 0 64 0\nv 1 2\nf 1 2 3\nf 1 2 5\nf 1 2\n"
+    problems = mesh_grammar.validate_obj(text)
+    assert problems == {"chatter": 1, "coordinate_out_of_range": 1, "malformed_vertex": 1, "index_out_of_range": 1, "malformed_face": 1}
+    assert not mesh_grammar.is_valid(problems)
+
+def test_validate_obj_without_levels_checks_structure_only():
+    problems = mesh_grammar.validate_obj("```\nv -0.5 0 1.25\nv 1 0 0\nv 0 1 0\nf 1 2 3\n```\n", levels=None)
+    assert problems == {"chatter": 2}
+    assert mesh_grammar.is_valid(problems)
+
+def test_validate_obj_needs_faces():
+    assert mesh_grammar.validate_obj("v 0 0 0\n") == {"no_faces": 1}
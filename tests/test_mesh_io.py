@@ -0,0 +1,124 @@
+import numpy as np
+import mesh_io
+
+# Define a function to build a triangulated size x size grid with counter-clockwise winding
+def grid(size):
+    xs, ys = np.meshgrid(np.arange(size + 1), np.arange(size + 1), indexing="ij")
+    vertices = np.column_stack([xs.ravel(), ys.ravel(), np.zeros(xs.size)]).astype(np.float32)
+    corner = (np.arange(size)[:, None] * (size + 1) + np.arange(size)).ravel()
+    a, b, c, d = corner, corner + size + 1, corner + size + 2, corner + 1
+    loops = np.column_stack([a, b, c, a, c, d]).reshape(-1).astype(np.int32)
+    return vertices, loops, np.full(2 * len(corner), 3, dtype=np.int32)
+
+def directed_edges(loops, face_sizes):
+    following = loops[mesh_io._next_corners(face_sizes)]
+    return set(zip(loops.tolist(), following.tolist()))
+
+def test_orient_faces_unflips_a_minority():
+    vertices, loops, face_sizes = grid(6)
+    flipped = np.arange(len(face_sizes)) % 5 == 0
+    broken = loops.reshape(-1, 3).copy()
+    broken[flipped] = broken[flipped, ::-1]
+    oriented, flips, non_manifold, inconsistent = mesh_io.orient_faces(len(vertices), broken.reshape(-1), face_sizes)
+    assert flips == np.count_nonzero(flipped)
+    assert (non_manifold, inconsistent) == (0, 0)
+    assert directed_edges(oriented, face_sizes) == directed_edges(loops, face_sizes)
+
+def test_repair_mesh_reorients_and_reports():
+    vertices, loops, face_sizes = grid(4)
+    broken = loops.reshape(-1, 3).copy()
+    broken[[1, 6]] = broken[[1, 6], ::-1]
+    repaired, repaired_loops, repaired_sizes, fixes = mesh_io.repair_mesh(vertices, broken.reshape(-1), face_sizes)
+    assert fixes == {"flipped_faces": 2}
+    assert len(repaired) == len(vertices)
+    assert directed_edges(repaired_loops, repaired_sizes) == directed_edges(loops, face_sizes)
+
+def test_repair_mesh_drops_duplicate_faces():
+    vertices, loops, face_sizes = grid(2)
+    duplicate = loops[:3][::-1]
+    loops = np.concatenate([loops, duplicate])
+    face_sizes = np.append(face_sizes, 3)
+    _, repaired_loops, repaired_sizes, fixes = mesh_io.repair_mesh(vertices, loops, face_sizes)
+    assert fixes["duplicate_faces"] == 1
+    assert len(repaired_sizes) == len(face_sizes) - 1
+
+def test_weld_vertices_merges_coincident_vertices():
+    vertices = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [1e-9, 0, 0], [1, 1e-9, 0]], dtype=np.float32)
+    loops = np.array([0, 1, 2, 3, 4, 2], dtype=np.int32)
+    welded, welded_loops = mesh_io.weld_vertices(vertices, loops, 1e-6)
+    np.testing.assert_array_equal(welded, vertices[:3])
+    np.testing.assert_array_equal(welded_loops, [0, 1, 2, 0, 1, 2])
+
+def test_weld_vertices_keeps_distinct_vertices():
+    vertices, loops, _ = grid(3)
+    welded, welded_loops = mesh_io.weld_vertices(vertices, loops, 1e-6)
+    assert welded is vertices and welded_loops is loops
+
+OBJ_TEXT = """# exported
+o Mesh
+v 0 0 0
+v 1.5 0 0
+vt 0.5 0.5
+v 1 1 0 1.0
+v 0 1 0
+f 1/1/1 2/2/2 3/3/3
+f -4 -2 -1
+f 1 2
+f 1 2 3 4
+"""
+
+def test_parse_records_reads_vertices_and_faces():
+    vertices, loops, face_sizes = mesh_io._parse_records(OBJ_TEXT)
+    np.testing.assert_array_equal(vertices, [[0, 0, 0], [1.5, 0, 0], [1, 1, 0], [0, 1, 0]])
+    np.testing.assert_array_equal(loops, [0, 1, 2, 0, 2, 3, 0, 1, 2, 3])
+    np.testing.assert_array_equal(face_sizes, [3, 3, 4])
+    assert loops.dtype == np.int32
+
+def test_parse_records_matches_the_line_parser():
+    for expected, actual in zip(mesh_io._parse_lines(OBJ_TEXT), mesh_io._parse_records(OBJ_TEXT)):
+        np.testing.assert_array_equal(expected, actual)
+
+def test_parse_records_offsets_negative_indices():
+    _, loops, _ = mesh_io._parse_records("v 0 0 0\nf -3 -2 -1\n", vertex_offset=2)
+    np.testing.assert_array_equal(loops, [0, 1, 2])
+
+def test_parse_obj_falls_back_on_chatter():
+    vertices, loops, face_sizes = mesh_io.parse_obj("v 0 0 0\nv 1 0 0\nv 0 1 0\nf is for faces\nf 1 2 3\n")
+    assert len(vertices) == 3
+    np.testing.assert_array_equal(loops, [0, 1, 2])
+
+def test_parse_obj_reads_indented_records():
+    text = "Here is the mesh:\n    v 0 0 0\n\tv 1 0 0\n  v 0 1 0\n    f 1 2 3\n  \n v 1 1 0\n f 2 4 -2\n"
+    parsed = mesh_io.parse_obj(text)
+    expected = mesh_io._parse_lines(text)
+    assert len(parsed[0]) == 4 and len(parsed[2]) == 2
+    for actual, wanted in zip(parsed, expected):
+        np.testing.assert_array_equal(actual, wanted)
+
+def test_streaming_parser_does_not_end_on_indented_records():
+    parser = mesh_io.StreamingObjParser()
+    parser.feed("  v 0 0 0\n  v 1 0 0\n  v 0 1 0\n  f 1 2 3\n")
+    parser.feed("  v 1 1 0\n  f 2 4 3\n")
+    assert not parser.ended
+    assert (parser.vertex_count, parser.face_count) == (4, 2)
+
+def test_streaming_parser_matches_parse_obj_for_any_chunking():
+    text = "Sure:\n```\nv 0 0 0\nv 10 0 0\nv 0 10 0\nv 0 0 10\nf 1 3 2\nf 1 2 4\nf 2/1 3/2 4/3\nf -4 -1 -2\n```\n"
+    expected = mesh_io.parse_obj(text)
+    for size in (1, 3, 7, 16, len(text)):
+        parser = mesh_io.StreamingObjParser(capacity=2)
+        for start in range(0, len(text), size):
+            parser.feed(text[start:start + size])
+        parser.close()
+        for actual, wanted in zip((parser.vertices, parser.loops, parser.face_sizes), expected):
+            np.testing.assert_array_equal(actual, wanted)
+        assert parser.ended
+
+def test_streaming_parser_resume_drops_the_partial_line():
+    parser = mesh_io.StreamingObjParser()
+    parser.feed("v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2")
+    parser.resume()
+    parser.feed("f 1 2 3\n")
+    parser.close()
+    assert (parser.vertex_count, parser.face_count) == (3, 1)
+    np.testing.assert_array_equal(parser.loops, [0, 1, 2])
@@ -0,0 +1,105 @@
+import time
+import requests
+from ssd_mesh_extension import lm_client, mesh_stream
+
+URL = "http://localhost:5000/v1/chat/completions"
+PAYLOAD = {"model": "test", "messages": [{"role": "user", "content": "a triangle"}], "max_tokens": 100}
+TRIANGLE = "v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n"
+
+# Stands for the end of a reply stopped by the token limit (finish reason "length", no [DONE])
+LENGTH = "<length>"
+
+# Define a function to play one reply given as a token list: an exception is raised, a number is
+# a pause in seconds and LENGTH cuts the reply off
+def play(reply, on_stats, on_done):
+    for token in reply:
+        if isinstance(token, Exception):
+            raise token
+        if isinstance(token, float):
+            time.sleep(token)
+        elif token == LENGTH:
+            on_stats({"choices": [{"finish_reason": "length"}]})
+            return
+        else:
+            yield token
+    if on_done is not None:
+        on_done()
+
+# Define a function to replace the HTTP stream with replies given as token lists, answered in
+# request order. Returns the payloads that were sent.
+def fake_server(monkeypatch, *replies):
+    sent = []
+    def stream_chat_completion(url, payload, on_stats=None, on_done=None, **kwargs):
+        reply = replies[len(sent)]
+        sent.append(payload)
+        yield from play(reply, on_stats, on_done)
+    monkeypatch.setattr(lm_client, "stream_chat_completion", stream_chat_completion)
+    return sent
+
+def run(generation, timeout=5.0):
+    expires = time.monotonic() + timeout
+    while not generation.poll():
+        assert time.monotonic() < expires, "generation did not finish"
+        time.sleep(0.01)
+    return generation
+
+def test_mid_line_failure_drops_the_partial_line(monkeypatch):
+    failure = requests.exceptions.ConnectionError("connection reset")
+    sent = fake_server(monkeypatch, [TRIANGLE, "v 0 0 6", failure], ["v 0 0 63\n"])
+    stream = run(mesh_stream.MeshStream(URL, PAYLOAD, max_continuations=1, use_cache=False))
+    assert len(sent) == 2
+    assert sent[1]["messages"][-2]["content"] == TRIANGLE
+    assert stream.text == TRIANGLE + "v 0 0 63\n"
+    assert "Error" not in stream.text
+
+def test_failure_without_continuations_is_truncated(monkeypatch):
+    fake_server(monkeypatch, [TRIANGLE, "v 0 0 6", requests.exceptions.ConnectionError("reset")])
+    stream = run(mesh_stream.MeshStream(URL, PAYLOAD, max_continuations=0, use_cache=False))
+    assert stream.text == TRIANGLE
+    assert stream.truncated and not stream.valid()
+
+TETRAHEDRON = "v 0 0 0\nv 1 0 0\nv 0 1 0\nv 0 0 1\nf 1 3 2\nf 1 2 4\nf 2 3 4\nf 1 4 3\n"
+
+def test_closed_mesh_stops_the_stream_early(monkeypatch):
+    chatter = ["Here", " is", " some", " more", " text"] * 100
+    fake_server(monkeypatch, [TETRAHEDRON, 0.05] + [token for word in chatter for token in (word, 0.01)])
+    stream = run(mesh_stream.MeshStream(URL, PAYLOAD, use_cache=False))
+    assert stream.early_stopped and not stream.truncated
+    assert stream.text == TETRAHEDRON
+    assert stream.tokens < len(chatter)
+    assert stream.valid()
+
+def test_cut_off_reply_is_continued_from_the_last_complete_line(monkeypatch):
+    sent = fake_server(monkeypatch, ["v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 ", LENGTH], ["f 1 2 3\n"])
+    stream = run(mesh_stream.MeshStream(URL, PAYLOAD, use_cache=False))
+    assert stream.continuations == 1
+    assert sent[1]["messages"][:-2] == PAYLOAD["messages"]
+    assert sent[1]["messages"][-2] == {"role": "assistant", "content": "v 0 0 0\nv 1 0 0\nv 0 1 0\n"}
+    assert sent[1]["messages"][-1]["content"] == mesh_stream.CONTINUE_PROMPT
+    assert stream.text == TRIANGLE
+    assert (stream.parser.vertex_count, stream.parser.face_count) == (3, 1)
+    assert stream.valid()
+
+def test_still_cut_off_after_the_last_continuation_is_truncated(monkeypatch):
+    sent = fake_server(monkeypatch, ["v 0 0 0\n", LENGTH], ["v 1 0 0\n", LENGTH])
+    stream = run(mesh_stream.MeshStream(URL, PAYLOAD, max_continuations=1, use_cache=False))
+    assert len(sent) == 2
+    assert stream.truncated and not stream.valid()
+
+def test_race_keeps_the_first_valid_candidate(monkeypatch):
+    # Candidate seeds: 0 answers fast with a broken mesh, 1 is slow, 2 is the first valid one
+    replies = {
+        0: ["v 0 0 0\nf 1 2 3\n"],
+        1: [0.5, TRIANGLE],
+        2: [0.05, TETRAHEDRON],
+    }
+    def stream_chat_completion(url, payload, on_stats=None, on_done=None, **kwargs):
+        yield from play(replies[payload["seed"]], on_stats, on_done)
+    monkeypatch.setattr(lm_client, "stream_chat_completion", stream_chat_completion)
+    race = run(mesh_stream.MeshRace(URL, PAYLOAD, candidates=3, use_cache=False))
+    assert race.valid()
+    assert race.winner.payload["seed"] == 2
+    assert race.text == TETRAHEDRON
+    assert [candidate.payload["temperature"] for candidate in race.candidates] == [0.55, 0.7, 0.85]
+    loser = race.candidates[1]
+    assert loser.finished and loser.truncated
@@ -0,0 +1,63 @@
+import message_history
+
+CUBE = "v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\nf 1 2 3 4"
+
+def exchange(prompt, reply):
+    return [{"type": "user", "content": prompt}, {"type": "assistant", "content": reply}]
+
+def test_build_messages_stubs_older_obj_replies():
+    history = exchange("a cube", CUBE) + exchange("a bigger cube", CUBE.replace("1", "2")) + exchange("thanks", "You're welcome")
+    messages = message_history.build_messages(history, "system", "a pyramid")
+    assert messages[0] == {"role": "system", "content": "system"}
+    assert messages[-1] == {"role": "user", "content": "a pyramid"}
+    replies = [message["content"] for message in messages if message["role"] == "assistant"]
+    assert replies[0] == "[OBJ mesh from an earlier reply omitted (5 lines)]"
+    assert replies[1] == "```\n" + CUBE.replace("1", "2") + "\n```"
+    assert replies[2] == "You're welcome"
+
+def test_build_messages_keeps_the_newest_turns_within_budget():
+    history = [entry for turn in range(50) for entry in exchange(f"question {turn} " * 20, f"answer {turn} " * 20)]
+    messages = message_history.build_messages(history, "system", "last question", budget=600, reserve=100)
+    tokens = sum(message_history.count_tokens(message["content"]) + message_history.MESSAGE_OVERHEAD for message in messages)
+    assert tokens <= 500
+    assert messages[1]["role"] == "user"
+    assert messages[-2]["content"] == "answer 49 " * 20
+
+def test_build_messages_without_history():
+    assert message_history.build_messages([], "system", "hi") == [
+        {"role": "system", "content": "system"},
+        {"role": "user", "content": "hi"},
+    ]
+
+PARAMS = {"model": "test", "max_tokens": 50}
+
+def test_chat_session_only_appends_to_the_prompt():
+    session = message_history.ChatSession("system")
+    first = session.payload("a cube", PARAMS)
+    session.record("a cube", CUBE)
+    second = session.payload("make it red", PARAMS)
+    assert second["messages"][:len(first["messages"])] == first["messages"]
+    assert second["messages"][-2]["content"] == "```\n" + CUBE + "\n```"
+    assert second["user"] == first["user"] == session.conversation_id
+    assert first["cache_prompt"] is True
+
+def test_chat_sessions_have_their_own_conversation_ids():
+    assert message_history.ChatSession("system").conversation_id != message_history.ChatSession("system").conversation_id
+
+def test_chat_session_compacts_once_the_budget_is_exhausted():
+    session = message_history.ChatSession("system", budget=400)
+    for turn in range(20):
+        session.build(f"question {turn}", reserve=50)
+        session.record(f"question {turn}", f"answer {turn} " * 10)
+    assert session.compactions >= 1
+    messages = session.build("last question", reserve=50)
+    assert session.tokens + 50 <= session.budget
+    assert messages[-2]["content"] == "answer 19 " * 10
+
+def test_chat_session_measures_prefix_reuse():
+    session = message_history.ChatSession("system")
+    session.record("hi", "hello", {"timings": {"prompt_n": 10, "prompt_ms": 20.0, "cache_n": 30}})
+    session.record("again", "hello", {"usage": {"prompt_tokens": 50, "prompt_tokens_details": {"cached_tokens": 45}}})
+    stats = session.stats()
+    assert (stats["turns"], stats["prompt_tokens"], stats["cached_tokens"]) == (2, 90, 75)
+    assert stats["prefill_ms_saved"] == 60.0
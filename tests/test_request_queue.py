@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+import pytest
+from ssd_mesh_extension import lm_client, request_queue
+
+URL = "http://localhost:5000/v1/chat/completions"
+
+# Define a function to replace post_json with an echo server that records concurrency; a payload
+# with "fail" raises instead of answering
+def fake_server(monkeypatch, delay=0.05):
+    seen = {"calls": 0, "active": 0, "peak": 0}
+    lock = threading.Lock()
+    def post_json(url, payload, headers=None):
+        with lock:
+            seen["calls"] += 1
+            seen["active"] += 1
+            seen["peak"] = max(seen["peak"], seen["active"])
+        time.sleep(delay)
+        with lock:
+            seen["active"] -= 1
+        if payload.get("fail"):
+            raise ConnectionError("server went away")
+        content = payload["prompt"]
+        return {"choices": [{"message": {"content": content}}], "usage": {"completion_tokens": len(content)}}
+    monkeypatch.setattr(lm_client, "post_json", post_json)
+    return seen
+
+def test_each_caller_gets_its_own_response(monkeypatch):
+    fake_server(monkeypatch)
+    queue = request_queue.RequestQueue(URL)
+    prompts = [f"prompt {index}" for index in range(6)]
+    responses = asyncio.run(queue.map([{"prompt": prompt} for prompt in prompts]))
+    assert [lm_client.completion_text(response) for response in responses] == prompts
+    stats = queue.stats()
+    assert (stats["requests"], stats["batches"], stats["tokens"]) == (6, 1, sum(map(len, prompts)))
+    assert stats["requests_per_s"] > 0
+
+def test_batches_are_capped_and_inflight_requests_limited(monkeypatch):
+    seen = fake_server(monkeypatch)
+    queue = request_queue.RequestQueue(URL, max_batch=3, max_inflight=2)
+    asyncio.run(queue.map([{"prompt": str(index)} for index in range(7)]))
+    assert seen["calls"] == 7
+    assert seen["peak"] == 2
+    assert queue.batches == 3
+
+def test_failures_reach_only_their_caller(monkeypatch):
+    fake_server(monkeypatch)
+    queue = request_queue.RequestQueue(URL)
+    ok, failed = asyncio.run(queue.map([{"prompt": "ok"}, {"prompt": "x", "fail": True}], return_exceptions=True))
+    assert lm_client.completion_text(ok) == "ok"
+    assert isinstance(failed, ConnectionError)
+    with pytest.raises(ConnectionError):
+        asyncio.run(queue.submit({"prompt": "x", "fail": True}))
+
+def test_queue_works_from_several_event_loops(monkeypatch):
+    fake_server(monkeypatch, delay=0)
+    queue = request_queue.RequestQueue(URL)
+    for index in range(3):
+        assert lm_client.completion_text(asyncio.run(queue.submit({"prompt": str(index)}))) == str(index)
+    # States of loops closed by asyncio.run are dropped when the next loop registers
+    assert len(queue._states) == 1
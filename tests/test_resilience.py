@@ -0,0 +1,157 @@
+import time
+import threading
+import pytest
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ssd_mesh_extension import lm_client, resilience
+
+URL = "http://localhost:5000/v1/chat/completions"
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+# Define a function to build a send(timeout) that answers with the given status codes or raises the
+# given exceptions in turn; the timeouts it was called with are recorded
+def fake_send(*answers):
+    timeouts = []
+    def send(timeout):
+        answer = answers[len(timeouts)]
+        timeouts.append(timeout)
+        if isinstance(answer, Exception):
+            raise answer
+        return FakeResponse(answer)
+    send.timeouts = timeouts
+    return send
+
+# Backoff sleeps only happen off Blender's main thread, so retries are exercised in a worker
+def in_worker(function, *args, **kwargs):
+    with ThreadPoolExecutor(1) as pool:
+        return pool.submit(function, *args, **kwargs).result(timeout=5)
+
+def wait_for(condition, timeout=2.0):
+    expires = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < expires, "condition not met"
+        time.sleep(0.005)
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(resilience, "counters", dict.fromkeys(resilience.counters, 0))
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0)
+
+def test_backoff_delay_is_capped_full_jitter():
+    for attempt in range(10):
+        cap = min(resilience.BACKOFF_MAX, resilience.BACKOFF_BASE * 2 ** attempt)
+        delays = [resilience.backoff_delay(attempt) for _ in range(50)]
+        assert all(0 <= delay <= cap for delay in delays)
+        assert len(set(delays)) > 1
+
+def test_server_errors_are_retried(no_backoff):
+    send = fake_send(503, requests.exceptions.ConnectionError("reset"), 200)
+    response = in_worker(resilience.call, URL, send)
+    assert response.status_code == 200
+    assert len(send.timeouts) == 3
+    assert resilience.counters["retries"] == 2
+    assert resilience.breaker_for(URL).failures == 0
+
+def test_main_thread_makes_a_single_attempt(no_backoff):
+    send = fake_send(503, 200)
+    with pytest.raises(requests.exceptions.HTTPError):
+        resilience.call(URL, send)
+    assert len(send.timeouts) == 1
+
+def test_gives_up_after_max_attempts(no_backoff):
+    send = fake_send(*[500] * resilience.MAX_ATTEMPTS)
+    with pytest.raises(requests.exceptions.HTTPError):
+        in_worker(resilience.call, URL, send)
+    assert len(send.timeouts) == resilience.MAX_ATTEMPTS
+
+def test_timeouts_fit_in_the_deadline(no_backoff):
+    send = fake_send(200)
+    resilience.call(URL, send, deadline=2.0)
+    connect, read = send.timeouts[0]
+    assert connect <= min(resilience.CONNECT_TIMEOUT, 2.0)
+    assert read <= 2.0
+
+def test_expired_deadline_is_not_sent(no_backoff):
+    send = fake_send(200)
+    with pytest.raises(resilience.DeadlineExceeded):
+        resilience.call(URL, send, deadline=0)
+    assert send.timeouts == []
+    assert resilience.counters["timeouts"] == 1
+
+def test_open_circuit_fails_fast_until_a_probe_succeeds(no_backoff, monkeypatch):
+    probes, released = [], threading.Event()
+    class ProbeSession:
+        def get(self, url, timeout):
+            # Hold the probes back until the open circuit has been observed
+            released.wait(5)
+            probes.append(url)
+            return FakeResponse(200 if len(probes) > 1 else 503)
+    monkeypatch.setattr(lm_client, "get_session", lambda: ProbeSession())
+    monkeypatch.setattr(resilience, "PROBE_INTERVAL", 0.01)
+    breaker = resilience.breaker_for(URL)
+    for _ in range(resilience.FAILURE_THRESHOLD):
+        with pytest.raises(requests.exceptions.HTTPError):
+            resilience.call(URL, fake_send(502))
+    assert breaker.state == resilience.CircuitBreaker.OPEN
+    send = fake_send(200)
+    with pytest.raises(resilience.CircuitOpenError):
+        resilience.call(URL, send)
+    assert send.timeouts == []
+    assert resilience.counters["open_circuit_rejections"] == 1
+    released.set()
+    wait_for(lambda: breaker.state == resilience.CircuitBreaker.CLOSED)
+    assert probes[0] == "http://localhost:5000" + resilience.PROBE_PATH
+    assert resilience.call(URL, fake_send(200)).status_code == 200
+
+def test_rate_limits_do_not_open_the_circuit(no_backoff):
+    for _ in range(resilience.FAILURE_THRESHOLD + 1):
+        with pytest.raises(requests.exceptions.HTTPError):
+            resilience.call(URL, fake_send(429))
+    assert resilience.breaker_for(URL).state == resilience.CircuitBreaker.CLOSED
+
+# Answers with three SSE chunks spread over longer than the deadline, then stalls
+class SlowStreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk = b'data: {"choices":[{"delta":{"content":"v"}}]}\n\n'
+        for _ in range(3):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+            time.sleep(0.2)
+        time.sleep(1.0)
+
+    def log_message(self, *args):
+        pass
+
+def test_streams_outlive_the_deadline_but_not_a_stall(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowStreamHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(resilience, "STREAM_IDLE_TIMEOUT", 0.5)
+    tokens = []
+    try:
+        with pytest.raises(resilience.StreamStalled):
+            for token in lm_client.stream_chat_completion(f"http://127.0.0.1:{server.server_port}/v1/chat/completions", {}, deadline=0.3):
+                tokens.append(token)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert tokens == ["v"] * 3
+    assert resilience.counters["timeouts"] == 1
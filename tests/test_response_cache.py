@@ -0,0 +1,54 @@
+import response_cache
+
+PAYLOAD = {"model": "m", "messages": [{"role": "user", "content": "a cube"}], "temperature": 0.7, "max_tokens": 100}
+
+def test_cache_key_ignores_delivery_fields_and_whitespace():
+    spaced = {**PAYLOAD, "messages": [{"role": "User ", "content": "  a   cube\n"}], "stream": True, "user": "conversation-1", "cache_prompt": True}
+    assert response_cache.cache_key(spaced) == response_cache.cache_key(PAYLOAD)
+
+def test_cache_key_covers_sampling_fields():
+    assert response_cache.cache_key({**PAYLOAD, "temperature": 0.2}) != response_cache.cache_key(PAYLOAD)
+    assert response_cache.cache_key({**PAYLOAD, "seed": 1}) != response_cache.cache_key(PAYLOAD)
+
+def test_lru_evicts_least_recently_used_by_bytes():
+    cache = response_cache.ResponseCache(max_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    assert cache.get("a") == "aaaa"
+    cache.put("c", "cccc")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("aaaa", "cccc")
+    stats = cache.stats()
+    assert (stats["evictions"], stats["entries"], stats["bytes"]) == (1, 2, 8)
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+
+def test_oversized_values_are_not_kept_in_memory():
+    cache = response_cache.ResponseCache(max_bytes=4)
+    cache.put("small", "ok")
+    cache.put("big", "too large")
+    assert cache.get("big") is None
+    assert cache.get("small") == "ok"
+
+def test_disk_store_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / "cache" / "responses.sqlite")
+    cache = response_cache.ResponseCache(path=path)
+    cache.put("key", "response")
+    cache.close()
+    reopened = response_cache.ResponseCache(path=path)
+    assert reopened.get("key") == "response"
+    assert reopened.stats()["entries"] == 1
+    reopened.close()
+
+def test_disk_store_prunes_least_recently_used(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(response_cache.time, "time", lambda: next(clock))
+    path = str(tmp_path / "responses.sqlite")
+    cache = response_cache.ResponseCache(path=path, disk_max_bytes=10)
+    cache.put("old", "aaaaaa")
+    cache.put("new", "bbbbbb")
+    cache.close()
+    # A new cache starts with an empty LRU, so only the disk store can answer
+    reopened = response_cache.ResponseCache(path=path, disk_max_bytes=10)
+    assert reopened.get("old") is None
+    assert reopened.get("new") == "bbbbbb"
+    reopened.close()
@@ -1,19 +1,33 @@
 import bpy
 import requests
 import logging
-import gradio as gr
-import time
-import random
 import gc
-from oneapi import dnnl
-import llama.cpp
-from openvino.runtime import Core, CompiledModel
 from bpy.types import Panel, Operator
 from bpy.utils import register_class, unregister_class
+from . import batch_executor, lm_client, mesh_grammar, mesh_io, mesh_stream, model_registry, openvino_pool, scheduler
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
+# LM Studio connection used by the mesh tools
+LM_STUDIO_API_URL = "http://localhost:5000/v1/chat/completions"
+LM_STUDIO_HEADERS = {
+    "Content-Type": "application/json",
+    "Authorization": "Bearer dummy-token"  # Replace with an actual token if required
+}
+MESH_NAME = "LLaMA-Mesh"
+MESH_PREVIEW_INTERVAL = 0.25  # Seconds between partial mesh updates while streaming
+# Constrain mesh generations to bare v/f lines with a GBNF grammar (llama.cpp-based servers accept a
+# "grammar" field; the local LLaMA-Mesh model always uses it)
+CONSTRAIN_MESH_OUTPUT = False
+# Concurrent candidates sampled per mesh (different seeds and temperatures); the first valid one wins.
+# 1 sends a single request.
+MESH_CANDIDATES = 1
+# Generate meshes with the local LLaMA-Mesh model (LLAMA_MESH_MODEL_PATH) instead of LM Studio
+LOCAL_MESH_GENERATION = False
+LLAMA_MESH_MODEL_PATH = "path/to/LLaMA-Mesh.gguf"
+LLAMA_MESH_CONTEXT_TOKENS = 8192
+
 # Define a custom Blender panel
 class AIExtensionPanel(Panel):
     bl_label = "AI Extension"
@@ -58,34 +72,81 @@ class AI_Load_Model(Operator):
 
     def execute(self, context):
         prompt = "What should the scene look like?"
-        response = get_model_response(prompt, [], "", model_params=None, retry_count=3)
-        if response:
-            context.scene.ai_output_text = response
-            update_scene(response)
+        scene = context.scene
+
+        # Runs on the main thread once the background requests have finished; only touches bpy data
+        def on_done(job):
+            if job.state != scheduler.DONE:
+                return
+            answer, mesh_prompt = job.result
+            scene.ai_output_text = answer
+            if mesh_prompt is None:
+                logging.error(f"Scene not updated: {answer}")
+                return
+            apply_scene(mesh_prompt)
+
+        scheduler.default_scheduler.submit(load_model_job, prompt, name="ai_load_model", on_done=on_done)
         return {'FINISHED'}
 
+# Define a function to run every LLM round-trip of AI_Load_Model on a worker thread: the model's
+# answer, then the chain of thought that turns it into a mesh prompt (None when a request failed)
+def load_model_job(prompt):
+    answer = get_model_response(prompt, [], "")
+    if is_error_response(answer):
+        return answer, None
+    return answer, plan_scene(answer)
+
+# Define a function to tell whether get_model_response returned one of its error messages
+def is_error_response(text):
+    return not text or text.startswith("Error:")
+
 # Define a function to interact with the LM Studio API
 def query_lm_studio(prompt):
-    api_url = "http://127.0.0.1:1234/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Bearer dummy-token"  # Replace with an actual token if required
-    }
-    payload = {
+    try:
+        return lm_client.post_json(LM_STUDIO_API_URL, lm_studio_payload(prompt), LM_STUDIO_HEADERS)
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error: {e}")
+        return None
+
+# Define a function to build the chat payload sent to LM Studio
+def lm_studio_payload(prompt):
+    return {
         "model": "llama",
         "messages": [{"role": "user", "content": prompt}],
         "temperature": 0.7,
         "max_tokens": 512
     }
-    response = requests.post(api_url, headers=headers, json=payload)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        logging.error(f"Error: {response.status_code}, {response.text}")
-        return None
+
+# Define a function to build the payload of a mesh generation, grammar-constrained when enabled.
+# `model_params` (e.g. temperature, top_p, max_tokens) override the defaults as in get_model_response.
+def mesh_payload(prompt, model_params=None):
+    payload = {**lm_studio_payload(prompt), **(model_params or {})}
+    if CONSTRAIN_MESH_OUTPUT:
+        payload["grammar"] = mesh_grammar.obj_grammar()
+    return payload
+
+# Define a function to load the LLaMA-Mesh model with llama-cpp-python
+def load_llama_mesh_model():
+    from llama_cpp import Llama
+    return Llama(model_path=LLAMA_MESH_MODEL_PATH, n_ctx=LLAMA_MESH_CONTEXT_TOKENS, verbose=False)
+
+model_registry.default_registry.register("llama-mesh", load_llama_mesh_model)
+
+# Define a function to generate OBJ text with the local LLaMA-Mesh model, constrained by the OBJ grammar
+def generate_obj_locally(prompt, max_tokens=4096):
+    completion = model_registry.default_registry.get("llama-mesh").create_chat_completion(
+        messages=[{"role": "user", "content": prompt}],
+        grammar=mesh_grammar.llama_grammar(),
+        temperature=0.7,
+        max_tokens=max_tokens,
+    )
+    text = completion["choices"][0]["message"]["content"]
+    mesh_grammar.default_report.record(text, completion["usage"]["completion_tokens"], constrained=True)
+    return text
 
 # Define a function to optimize GPU usage with Intel oneAPI
 def optimize_gpu(model_params):
+    from oneapi import dnnl  # Heavy import, deferred until first use
     # Use DNNL for optimized computations
     dnnl_config = {
         "engine_kind": dnnl.engine_kind.cpu,
@@ -94,31 +155,57 @@ def optimize_gpu(model_params):
     model_params["dnnl"] = dnnl_config
     return model_params
 
-# Define a function to load and optimize the model using OpenVINO
+# Define a function to load and optimize the model using OpenVINO (shared through the model registry)
 def load_model(model_path):
-    core = Core()
-    model = core.read_model(model_path)
-    compiled_model = core.compile_model(model, "GPU")
-    return compiled_model
+    return model_registry.default_registry.get(f"openvino:{model_path}", lambda: compile_openvino_model(model_path))
 
-# Define a function to run inference with OpenVINO
+# Device and throughput/latency hint come from openvino_pool.DEVICE and openvino_pool.PERFORMANCE_MODE;
+# the batch axis of a single-input model is made dynamic so concurrent calls can share a forward pass
+def compile_openvino_model(model_path):
+    return openvino_pool.compile_model(model_path, dynamic_batch=True)
+
+# Define a function to run inference with OpenVINO on the model's pool of reusable infer requests.
+# Concurrent calls to a model with a dynamic batch axis are batched together.
 def infer_with_openvino(compiled_model, input_data):
-    input_tensor = compiled_model.input("input").create_buffer(shape=(1, 256), dtype=np.float32)
-    output_tensor = compiled_model.output("output").create_buffer()
-    input_tensor.copy_from(input_data)
-    compiled_model inference([input_tensor], [output_tensor])
-    return np.frombuffer(output_tensor.memory.read(), dtype=np.float32)
+    pool = openvino_pool.pool_for(compiled_model)
+    if not openvino_pool.batchable(compiled_model):
+        return pool.infer(input_data)
+    rank = compiled_model.inputs[0].partial_shape.rank.get_length()
+    executor = batch_executor.executor_for(compiled_model, run_openvino_batch, workers=len(pool), rank=rank)
+    return executor.infer(input_data)
+
+def run_openvino_batch(compiled_model, batch):
+    return openvino_pool.pool_for(compiled_model).infer(batch)
 
 def load_model_llm_ipex(model_path):
+    return model_registry.default_registry.get(f"ipex:{model_path}", lambda: optimize_ipex_model(model_path))
+
+def optimize_ipex_model(model_path):
+    import torch
     import intel_extension_for_pytorch as ipex
-    from torch.jit import script, trace
     model = torch.load(model_path)
     model = ipex.optimize(model, "ipex")
     return model
 
-# Define a function to run inference with LLM-IPEX
-def infer_with_llm_ipex(model, input_data):
-    output = model(input_data)
+# Define a function to run inference with LLM-IPEX; concurrent calls are batched together.
+# `rank` is the model input's number of dimensions, taken from its first layer when not given.
+def infer_with_llm_ipex(model, input_data, rank=None):
+    rank = rank or ipex_input_rank(model)
+    return batch_executor.executor_for(model, run_ipex_batch, rank=rank).infer(input_data)
+
+# Define a function to get the input rank of a torch model from its first layer (None if unknown)
+def ipex_input_rank(model):
+    import torch
+    ranks = [(torch.nn.Linear, 2), (torch.nn.Embedding, 2), (torch.nn.Conv1d, 3), (torch.nn.Conv2d, 4), (torch.nn.Conv3d, 5)]
+    for module in model.modules():
+        for layer, rank in ranks:
+            if isinstance(module, layer):
+                return rank
+    return None
+
+def run_ipex_batch(model, batch):
+    import torch
+    output = model(torch.from_numpy(batch))
     return output.detach().numpy()
 
 # Define a function to handle the main logic of the Blender extension
@@ -134,28 +221,67 @@ def get_model_response(prompt, chat_history, system_prompt, model_params=None, r
             "system_prompt": system_prompt,
             **model_params
         }
-        # Retry logic for failed requests
-        for attempt in range(retry_count):
-            try:
-                response = requests.post(url, json=payload)
-                response.raise_for_status()
-                return response.json().get("text", "No response from model")
-            except requests.exceptions.RequestException as e:
-                logging.error(f"Request failed: {e}")
-                if attempt < retry_count - 1:
-                    time.sleep(random.uniform(1, 2))  # Randomized delay before retry
-                continue
+        # Retries with jittered backoff, the deadline and the circuit breaker live in lm_client/resilience
+        try:
+            return lm_client.post_json(url, payload, attempts=retry_count).get("text", "No response from model")
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Request failed: {e}")
         return "Error: Request to model failed after multiple attempts."
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         return "Error: Unexpected issue occurred"
 
-# Define a function to import mesh from LM Studio
-def import_mesh(prompt):
-    response = query_lm_studio(prompt)
-    if response and 'choices' in response and len(response['choices']) > 0:
-        mesh_data = response['choices'][0]['message']['content']
-        bpy.ops.import_scene.obj(filepath=mesh_data, use_edges=True, use_smooth_groups=False)
+# Define a function to import mesh from LM Studio, growing a preview mesh while it is generated.
+# With several candidates they are raced and the preview follows the one furthest along.
+def import_mesh(prompt, mesh_name=MESH_NAME, candidates=None, model_params=None):
+    mesh = bpy.data.meshes.get(mesh_name) or bpy.data.meshes.new(mesh_name)
+    mesh_object = bpy.data.objects.get(mesh_name)
+    if mesh_object is None:
+        mesh_object = bpy.data.objects.new(mesh_name, mesh)
+        bpy.context.scene.collection.objects.link(mesh_object)
+    if LOCAL_MESH_GENERATION:
+        # The local model returns the whole mesh at once, so there is no preview
+        def on_done(job):
+            text = job.result if job.state == scheduler.DONE else ""
+            set_final_mesh(mesh, mesh_name, *mesh_io.parse_obj(text))
+
+        scheduler.default_scheduler.submit(generate_obj_locally, prompt, name="generate_obj_locally", on_done=on_done)
+        return mesh_object
+    candidates = candidates or MESH_CANDIDATES
+    payload = mesh_payload(prompt, model_params)
+    if candidates > 1:
+        generation = mesh_stream.MeshRace(LM_STUDIO_API_URL, payload, headers=LM_STUDIO_HEADERS, candidates=candidates)
+    else:
+        generation = mesh_stream.MeshStream(LM_STUDIO_API_URL, payload, headers=LM_STUDIO_HEADERS)
+    shown = [None, 0, 0]  # Parser, vertex and face counts currently in the mesh datablock
+
+    # Timer callback on the main thread: parse new lines and push the partial mesh. Previews only
+    # skip faces whose vertices have not arrived yet; the full repair runs once on the final mesh.
+    def update_preview():
+        finished = generation.poll()
+        parser = generation.parser
+        if not finished:
+            if [parser, parser.vertex_count, parser.face_count] != shown:
+                vertices, loops = mesh_io.decode_quantized(parser.vertices, parser.loops)
+                mesh_io.update_mesh(mesh, vertices, loops, parser.face_sizes)
+                shown[:] = [parser, parser.vertex_count, parser.face_count]
+            return MESH_PREVIEW_INTERVAL
+        mesh_grammar.default_report.record(generation.text, generation.tokens, CONSTRAIN_MESH_OUTPUT)
+        mesh_stream.default_latencies.record("race" if candidates > 1 else "single", generation.elapsed, generation.valid())
+        set_final_mesh(mesh, mesh_name, parser.vertices, parser.loops, parser.face_sizes)
+        return None
+
+    bpy.app.timers.register(update_preview, first_interval=MESH_PREVIEW_INTERVAL)
+    return mesh_object
+
+# Define a function to decode, repair and store a finished mesh in its datablock
+def set_final_mesh(mesh, mesh_name, vertices, loops, face_sizes):
+    vertices, loops = mesh_io.decode_quantized(vertices, loops)
+    vertices, loops, face_sizes, fixes = mesh_io.repair_mesh(vertices, loops, face_sizes)
+    mesh_io.update_mesh(mesh, vertices, loops, face_sizes)
+    if fixes:
+        logging.info(f"Repaired mesh {mesh_name}: {dict(fixes)}")
+    if len(face_sizes):
         logging.info("Mesh imported successfully")
     else:
         logging.error("Failed to import mesh")
@@ -210,6 +336,8 @@ def multi_modal_agent(prompt):
     while len(thought_sequence) < 5:  # Limiting to 5 iterations
         new_prompt = refine_prompt(thought_sequence[-1])
         response = query_lm_studio(new_prompt)
+        if response is None:
+            return None
         thought_sequence.append(response['choices'][0]['message']['content'])
     return thought_sequence
 
@@ -220,6 +348,8 @@ def refine_prompt(prev_thought):
 def recursive_queries(prompt, depth=0):
     if depth < 3:  # Limiting to 3 levels of recursion
         response = query_lm_studio(prompt)
+        if response is None:
+            return []
         new_prompt = refine_query(response['choices'][0]['message']['content'])
         return [response] + recursive_queries(new_prompt, depth + 1)
     else:
@@ -237,11 +367,20 @@ def update_scene(prompt):
     for result in query_results:
         import_mesh(result['choices'][0]['message']['content'])
 
-# Define a function for multi-modal agent recursive chain-of-thought in update_scene
-def update_scene(prompt):
-    clear_scene()
+# Define a function for multi-modal agent recursive chain-of-thought in update_scene.
+# plan_scene makes the blocking LLM calls (run it off the main thread); apply_scene only changes the scene.
+def plan_scene(prompt):
     thought_sequence = multi_modal_agent(prompt)
-    import_mesh(thought_sequence[-1])
+    return thought_sequence[-1] if thought_sequence else None
+
+def apply_scene(mesh_prompt):
+    clear_scene()
+    import_mesh(mesh_prompt)
+
+def update_scene(prompt):
+    mesh_prompt = plan_scene(prompt)
+    if mesh_prompt is not None:
+        apply_scene(mesh_prompt)
 # Define a function to clear the current Blender scene
 def clear_scene():
     bpy.ops.object.select_all(action='SELECT')